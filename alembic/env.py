@@ -24,6 +24,8 @@ from src.event.benefit.model import *
 from src.event.criterion.model import *
 from src.profile.model import *
 from src.order.model import *
+from src.idempotency.model import *
+from src.report.model import *
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,65 @@
+"""snapshot order items
+
+Revision ID: 2b7d9e4f1a6c
+Revises: 8f3b2c1d4e5a
+Create Date: 2026-10-17 12:40:08.551263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7d9e4f1a6c'
+down_revision: Union[str, None] = '8f3b2c1d4e5a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('order_item', sa.Column('unit_price', sa.Double(), nullable=True))
+    op.add_column('order_item', sa.Column('title', sa.String(), nullable=True))
+    op.add_column('order_item', sa.Column('description', sa.String(), nullable=True))
+    op.add_column('order_item', sa.Column('ingredients', sa.JSON(), nullable=True))
+
+    # Past purchases were not snapshotted, the current state of the item is the best we have
+    op.execute(
+        """
+        UPDATE order_item
+        SET unit_price = item.cost,
+            title = item.title,
+            description = item.description,
+            ingredients = COALESCE((
+                SELECT json_agg(json_build_object(
+                    'name', COALESCE(ingredient.name, product.name, ''),
+                    'value_type', CASE WHEN ingredient.value_type_id IS NULL
+                                       THEN to_json(product_value_type.name)
+                                       ELSE to_json(ingredient.value_type_id) END,
+                    'product_id', ingredient.product_id,
+                    'value', ingredient.value,
+                    'cost', COALESCE(product.cost_per_one, 0)
+                ) ORDER BY ingredient.id)
+                FROM ingredient
+                LEFT JOIN product ON product.id = ingredient.product_id
+                LEFT JOIN product_value_type ON product_value_type.id = product.value_type_id
+                WHERE ingredient.item_id = item.id
+            ), '[]'::json)
+        FROM item
+        WHERE item.id = order_item.item_id
+        """
+    )
+
+    op.alter_column('order_item', 'unit_price', nullable=False)
+    op.alter_column('order_item', 'title', nullable=False)
+    op.alter_column('order_item', 'ingredients', nullable=False)
+    op.create_index('ix_order_item_order_id', 'order_item', ['order_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_item_order_id', table_name='order_item')
+    op.drop_column('order_item', 'ingredients')
+    op.drop_column('order_item', 'description')
+    op.drop_column('order_item', 'title')
+    op.drop_column('order_item', 'unit_price')
@@ -0,0 +1,41 @@
+"""materialize item cost
+
+Revision ID: 8f3b2c1d4e5a
+Revises: f6a15fd3a74b
+Create Date: 2026-10-17 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b2c1d4e5a'
+down_revision: Union[str, None] = 'f6a15fd3a74b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # item.cost of actualise_cost items is now maintained on writes, backfill it once
+    op.execute(
+        """
+        UPDATE item
+        SET cost = COALESCE((
+            SELECT SUM(ingredient.value * COALESCE(product.cost_per_one, 0))
+            FROM ingredient
+            LEFT JOIN product ON product.id = ingredient.product_id
+            WHERE ingredient.item_id = item.id
+        ), 0)
+        WHERE item.actualise_cost
+        """
+    )
+    op.create_index('ix_ingredient_item_id', 'ingredient', ['item_id'])
+    op.create_index('ix_ingredient_product_id', 'ingredient', ['product_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ingredient_product_id', table_name='ingredient')
+    op.drop_index('ix_ingredient_item_id', table_name='ingredient')
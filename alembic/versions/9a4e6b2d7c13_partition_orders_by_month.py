@@ -0,0 +1,95 @@
+"""partition orders by month
+
+Revision ID: 9a4e6b2d7c13
+Revises: 5e1c8a3f9b02
+Create Date: 2026-10-17 15:32:17.904211
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e6b2d7c13'
+down_revision: Union[str, None] = '5e1c8a3f9b02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # order.id stops being unique on its own, lines keep a plain order_id column
+    op.drop_constraint('order_item_order_id_fkey', 'order_item', type_='foreignkey')
+
+    op.execute('ALTER TABLE "order" RENAME TO order_unpartitioned')
+    op.execute('ALTER TABLE order_unpartitioned RENAME CONSTRAINT order_pkey TO order_unpartitioned_pkey')
+    op.execute('ALTER TABLE order_unpartitioned RENAME CONSTRAINT order_user_id_fkey TO order_unpartitioned_user_id_fkey')
+
+    op.execute(
+        """
+        CREATE TABLE "order" (
+            id BIGINT NOT NULL DEFAULT nextval('order_id_seq'),
+            user_id UUID,
+            cost DOUBLE PRECISION NOT NULL,
+            date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            comment VARCHAR(255),
+            CONSTRAINT order_pkey PRIMARY KEY (id, date),
+            CONSTRAINT order_user_id_fkey FOREIGN KEY (user_id) REFERENCES profile (id)
+        ) PARTITION BY RANGE (date)
+        """
+    )
+    op.execute('CREATE TABLE order_default PARTITION OF "order" DEFAULT')
+
+    # One partition per month from the oldest order up to two months ahead
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month DATE := date_trunc('month', COALESCE((SELECT min(date) FROM order_unpartitioned), now()))::date;
+            last_month DATE := (date_trunc('month', now()) + interval '2 months')::date;
+        BEGIN
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "order" FOR VALUES FROM (%L) TO (%L)',
+                    'order_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+                    month, (month + interval '1 month')::date
+                );
+                month := (month + interval '1 month')::date;
+            END LOOP;
+        END $$
+        """
+    )
+
+    op.execute('INSERT INTO "order" (id, user_id, cost, date, comment) '
+               'SELECT id, user_id, cost, date, comment FROM order_unpartitioned')
+    op.execute('ALTER SEQUENCE order_id_seq OWNED BY "order".id')
+    op.drop_table('order_unpartitioned')
+
+    op.create_index('ix_order_user_id_date', 'order', ['user_id', 'date'])
+    op.create_index('ix_order_item_ingredient_order_item_id', 'order_item_ingredient', ['order_item_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_item_ingredient_order_item_id', table_name='order_item_ingredient')
+
+    op.execute('ALTER TABLE "order" RENAME TO order_partitioned')
+    op.execute('ALTER TABLE order_partitioned RENAME CONSTRAINT order_pkey TO order_partitioned_pkey')
+    op.execute('ALTER TABLE order_partitioned RENAME CONSTRAINT order_user_id_fkey TO order_partitioned_user_id_fkey')
+    op.execute('ALTER INDEX ix_order_user_id_date RENAME TO ix_order_partitioned_user_id_date')
+
+    op.create_table('order',
+    sa.Column('id', sa.BigInteger(), server_default=sa.text("nextval('order_id_seq')"), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=True),
+    sa.Column('cost', sa.Double(), nullable=False),
+    sa.Column('date', sa.TIMESTAMP(), nullable=False),
+    sa.Column('comment', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['profile.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO "order" (id, user_id, cost, date, comment) '
+               'SELECT id, user_id, cost, date, comment FROM order_partitioned')
+    op.execute('ALTER SEQUENCE order_id_seq OWNED BY "order".id')
+    op.execute('DROP TABLE order_partitioned CASCADE')
+
+    op.create_foreign_key('order_item_order_id_fkey', 'order_item', 'order', ['order_id'], ['id'])
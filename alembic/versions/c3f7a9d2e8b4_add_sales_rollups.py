@@ -0,0 +1,54 @@
+"""add sales rollups
+
+Revision ID: c3f7a9d2e8b4
+Revises: 9a4e6b2d7c13
+Create Date: 2026-10-17 16:48:26.730459
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f7a9d2e8b4'
+down_revision: Union[str, None] = '9a4e6b2d7c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Double(), nullable=False),
+    sa.Column('units', sa.Double(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('sales_item_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('item_id', sa.BigInteger(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('units', sa.Double(), nullable=False),
+    sa.Column('revenue', sa.Double(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'item_id')
+    )
+    op.create_table('ingredient_consumption_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.BigInteger(), nullable=False),
+    sa.Column('quantity', sa.Double(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_table('report_watermark',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('report_watermark')
+    op.drop_table('ingredient_consumption_daily')
+    op.drop_table('sales_item_daily')
+    op.drop_table('sales_daily')
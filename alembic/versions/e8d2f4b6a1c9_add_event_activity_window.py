@@ -0,0 +1,34 @@
+"""add event activity window
+
+Revision ID: e8d2f4b6a1c9
+Revises: c3f7a9d2e8b4
+Create Date: 2026-10-17 18:05:41.216937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8d2f4b6a1c9'
+down_revision: Union[str, None] = 'c3f7a9d2e8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('event', sa.Column('starts_at', sa.TIMESTAMP(), nullable=True))
+    op.add_column('event', sa.Column('ends_at', sa.TIMESTAMP(), nullable=True))
+    op.create_index('ix_event_active_id', 'event', ['id'], postgresql_where=sa.text('is_active'))
+    op.create_index('ix_event_starts_at', 'event', ['starts_at'], postgresql_where=sa.text('starts_at IS NOT NULL'))
+    op.create_index('ix_event_ends_at', 'event', ['ends_at'], postgresql_where=sa.text('ends_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_ends_at', table_name='event')
+    op.drop_index('ix_event_starts_at', table_name='event')
+    op.drop_index('ix_event_active_id', table_name='event')
+    op.drop_column('event', 'ends_at')
+    op.drop_column('event', 'starts_at')
@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
@@ -8,6 +8,7 @@ from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
+from src.pagination import PageParams, page_params, set_next_cursor
 from src.allergen.schema import CreatingAllergen, GettingAllergen
 from src.allergen.service import create_allergen, delete_allergen, get_all, get_by_id
 
@@ -26,9 +27,12 @@ async def create_new_allergen(allergen: CreatingAllergen, db: AsyncSession = Dep
 
 
 @router.get("", response_model=List[GettingAllergen])
-async def get_allergens(db: AsyncSession = Depends(get_db)) -> List[GettingAllergen]:
+async def get_allergens(response: Response, page: PageParams = Depends(page_params),
+                        db: AsyncSession = Depends(get_db)) -> List[GettingAllergen]:
     try:
-        return await get_all(db)
+        allergens = await get_all(db, page)
+        set_next_cursor(response, allergens)
+        return allergens.items
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
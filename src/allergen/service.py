@@ -4,6 +4,8 @@ from sqlalchemy import select, delete
 
 from src.allergen.schema import CreatingAllergen, GettingAllergen
 from src.allergen.model import allergen  # Assuming you have the allergen table defined in models
+from src.pagination import Page, PageParams, apply_keyset, split_page
+from src.cache import catalog_cache, cache_key
 from typing import Optional, List
 
 
@@ -13,7 +15,7 @@ async def create_allergen(allergen_data: CreatingAllergen, db: AsyncSession) ->
     try:
         # Insert allergen into the database
         await db.execute(new_allergen)
-        await db.commit()
+        catalog_cache.mark_stale(db, "allergens")
 
         # Fetch the newly created allergen to return
         query = select(allergen).where(allergen.c.name == allergen_data.name)
@@ -36,11 +38,9 @@ async def create_allergen(allergen_data: CreatingAllergen, db: AsyncSession) ->
 async def delete_allergen(allergen_id: int, db: AsyncSession) -> None:
     query = delete(allergen).where(allergen.c.id == allergen_id)
     try:
-        result = await db.execute(query)
-        if result.rowcount > 0:
-            await db.commit()
-        else:
-            await db.rollback()
+        await db.execute(query)
+        # Product listings show allergen names
+        catalog_cache.mark_stale(db, "allergens", "products")
 
     except SQLAlchemyError as e:
         await db.rollback()
@@ -62,14 +62,24 @@ async def get_by_id(allergen_id: int, db: AsyncSession) -> Optional[GettingAller
         raise e  # Propagate the exception to the caller
 
 
-# Function to get all allergens
-async def get_all(db: AsyncSession) -> List[GettingAllergen]:
-    query = select(allergen)
+# Function to get a page of allergens
+async def get_all(db: AsyncSession, page: Optional[PageParams] = None) -> Page[GettingAllergen]:
+    return await catalog_cache.get_or_load(
+        "allergens", cache_key(page.limit, page.after) if page else "all",
+        lambda: _load_allergens(db, page)
+    )
+
+
+async def _load_allergens(db: AsyncSession, page: Optional[PageParams]) -> Page[GettingAllergen]:
+    query = apply_keyset(select(allergen), [allergen.c.id], page)
     try:
         result = await db.execute(query)
-        allergens = result.fetchall()
+        allergens, next_cursor = split_page(result.fetchall(), page, key=lambda row: (row.id,))
 
-        return [GettingAllergen(id=allergen.id, name=allergen.name) for allergen in allergens]
+        return Page(
+            items=[GettingAllergen(id=allergen.id, name=allergen.name) for allergen in allergens],
+            next_cursor=next_cursor
+        )
 
     except SQLAlchemyError as e:
         raise e  # Propagate the exception to the caller
@@ -18,7 +18,6 @@ async def create_role(role_data: RoleCreate, db: AsyncSession) -> RoleRead:
         ).returning(role.c.id, role.c.name, role.c.permissions)
 
         result = await db.execute(new_role_stmt)
-        await db.commit()
 
         # Return the created role data
         created_role = result.fetchone()
@@ -79,7 +78,6 @@ async def update_role(role_id: int, role_data: RoleUpdate, db: AsyncSession) ->
             update_stmt = update_stmt.values(permissions=role_data.permissions)
 
         result = await db.execute(update_stmt)
-        await db.commit()
 
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Role not found")
@@ -0,0 +1,175 @@
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import CACHE_BACKEND, CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_REDIS_URL
+from src.database import on_commit
+
+T = TypeVar("T")
+
+MISSING = object()
+
+
+class CacheBackend:
+    async def get(self, namespace: str, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def invalidate(self, namespace: str) -> None:
+        raise NotImplementedError
+
+    # Backends whose namespace version is visible to every worker
+    shared_versions = False
+
+    async def version(self, namespace: str) -> Optional[int]:
+        return None
+
+
+class NullCacheBackend(CacheBackend):
+    async def get(self, namespace: str, key: str) -> Any:
+        return MISSING
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    async def invalidate(self, namespace: str) -> None:
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per-worker LRU with TTL. Other workers only see an invalidation once their own
+    entries expire, so keep the TTL short when running several workers. Values are
+    pickled like in RedisCacheBackend, so a caller mutating what it got back cannot
+    change the cached entry.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, bytes]]" = OrderedDict()
+        self._keys_by_namespace: Dict[str, Set[str]] = {}
+
+    async def get(self, namespace: str, key: str) -> Any:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._drop((namespace, key))
+            return MISSING
+
+        self._entries.move_to_end((namespace, key))
+        return pickle.loads(value)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        self._entries[(namespace, key)] = (time.monotonic() + ttl, pickle.dumps(value))
+        self._entries.move_to_end((namespace, key))
+        self._keys_by_namespace.setdefault(namespace, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._keys_by_namespace.get(oldest[0], set()).discard(oldest[1])
+
+    async def invalidate(self, namespace: str) -> None:
+        for key in self._keys_by_namespace.pop(namespace, set()):
+            self._entries.pop((namespace, key), None)
+
+    def _drop(self, entry_key: Tuple[str, str]) -> None:
+        self._entries.pop(entry_key, None)
+        self._keys_by_namespace.get(entry_key[0], set()).discard(entry_key[1])
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared backend for all workers. Takes any client exposing the async get, set
+    and incr commands of redis.asyncio, so a local fake can stand in for it.
+    Invalidating a namespace bumps its version, which orphans the old entries
+    until their TTL removes them.
+    """
+
+    shared_versions = True
+
+    def __init__(self, client, prefix: str = "cache"):
+        self.client = client
+        self.prefix = prefix
+
+    async def version(self, namespace: str) -> Optional[int]:
+        return int(await self.client.get(f"{self.prefix}:{namespace}:version") or 0)
+
+    async def _versioned_key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{await self.version(namespace)}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Any:
+        raw = await self.client.get(await self._versioned_key(namespace, key))
+        return MISSING if raw is None else pickle.loads(raw)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(await self._versioned_key(namespace, key), pickle.dumps(value), ex=max(int(ttl), 1))
+
+    async def invalidate(self, namespace: str) -> None:
+        await self.client.incr(f"{self.prefix}:{namespace}:version")
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, ttl: float = CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._local_versions: Dict[str, int] = {}
+
+    async def get_or_load(self, namespace: str, key: str, loader: Callable[[], Awaitable[T]]) -> T:
+        value = await self.backend.get(namespace, key)
+        if value is MISSING:
+            value = await loader()
+            await self.backend.set(namespace, key, value, self.ttl)
+        return value
+
+    async def invalidate(self, *namespaces: str) -> None:
+        for namespace in namespaces:
+            self._local_versions[namespace] = self._local_versions.get(namespace, 0) + 1
+            await self.backend.invalidate(namespace)
+
+    async def version(self, namespace: str) -> Tuple[int, Optional[int]]:
+        """
+        Changes whenever the namespace is invalidated: by this worker always, by the
+        other workers only with a backend sharing its versions
+        """
+        return self._local_versions.get(namespace, 0), await self.backend.version(namespace)
+
+    def mark_stale(self, db: AsyncSession, *namespaces: str) -> None:
+        """
+        Invalidates the namespaces once the session's transaction commits, so no
+        reader can cache data that is about to be rolled back
+        """
+        pending: Optional[Set[str]] = db.info.get("stale_cache_namespaces")
+        if pending is None:
+            pending = db.info["stale_cache_namespaces"] = set()
+
+            async def _invalidate_pending():
+                await self.invalidate(*db.info.pop("stale_cache_namespaces", set()))
+
+            on_commit(db, _invalidate_pending)
+
+        pending.update(namespaces)
+
+
+def cache_key(*parts: Any) -> str:
+    return ":".join("" if part is None else str(part) for part in parts)
+
+
+def _build_backend() -> CacheBackend:
+    if CACHE_BACKEND == "redis":
+        import redis.asyncio as redis
+
+        return RedisCacheBackend(redis.from_url(CACHE_REDIS_URL))
+    if CACHE_BACKEND == "memory":
+        return MemoryCacheBackend()
+    return NullCacheBackend()
+
+
+catalog_cache = ResponseCache(_build_backend())
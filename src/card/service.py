@@ -28,7 +28,6 @@ async def create_card(card_data: CreatingCard, db: AsyncSession) -> Optional[Get
         ).returning(bonus_card.c.id, bonus_card.c.phone, bonus_card.c.user_id, bonus_card.c.count, bonus_card.c.used_points)
 
         result = await db.execute(stmt)
-        await db.commit()
 
         card_row = result.fetchone()
 
@@ -105,9 +104,8 @@ async def update_card(id: int, card_update: UpdatingCard, db: AsyncSession) -> O
             )
         )
 
-        # Выполняем запрос и коммитим изменения
+        # Выполняем запрос
         result = await db.execute(stmt)
-        await db.commit()
 
         updated_card_row = result.fetchone()
 
@@ -151,12 +149,14 @@ async def get_card_by_phone(phone_number: str, db: AsyncSession) -> Optional[Get
         raise e
 
 
-async def get_card_by_id(card_id: int, db: AsyncSession) -> Optional[GettingCard]:
+async def get_card_by_id(card_id: int, db: AsyncSession, for_update: bool = False) -> Optional[GettingCard]:
     """
-    Получение информации о бонусной карте по ID
+    Получение информации о бонусной карте по ID, с for_update строка блокируется до конца транзакции
     """
     try:
         stmt = select(bonus_card).where(bonus_card.c.id == card_id)
+        if for_update:
+            stmt = stmt.with_for_update()
         result = await db.execute(stmt)
         card_row = result.fetchone()
 
@@ -221,7 +221,6 @@ async def delete_card(id: int, db: AsyncSession) -> bool:
     try:
         stmt = delete(bonus_card).where(bonus_card.c.id == id)
         result = await db.execute(stmt)
-        await db.commit()
 
         return result.rowcount > 0  # Возвращаем True, если карта была удалена
 
@@ -239,7 +238,6 @@ async def update_card_count(card_id: int, new_count: int, new_used_points: int,
             .values(count=new_count, used_points=new_used_points)
         )
         await db.execute(stmt)
-        await db.commit()
     except SQLAlchemyError as e:
         await db.rollback()
         print(f"Database error while updating card count: {e}")
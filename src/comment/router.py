@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from uuid import UUID
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,6 +9,7 @@ from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
+from src.pagination import PageParams, page_params, set_next_cursor
 from src.comment.schema import GettingCommentForItem, GettingCommentForUser, CreatingComment
 from src.comment.service import create_comment_for_item, create_comment_for_user, get_comments_for_user, get_comments_for_item, delete_comment
 
@@ -36,17 +37,23 @@ async def create_user_comment(user_id: UUID, comment: CreatingComment, db: Async
 
 
 @router.get("/item/{item_id}", response_model=List[GettingCommentForItem])
-async def get_item_comments(item_id: int, db: AsyncSession = Depends(get_db)) -> List[GettingCommentForItem]:
+async def get_item_comments(item_id: int, response: Response, page: PageParams = Depends(page_params),
+                            db: AsyncSession = Depends(get_db)) -> List[GettingCommentForItem]:
     try:
-        return await get_comments_for_item(item_id, db)
+        comments = await get_comments_for_item(item_id, db, page)
+        set_next_cursor(response, comments)
+        return comments.items
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 
 @router.get("/user/{user_id}", response_model=List[GettingCommentForUser])
-async def get_user_comments(user_id: UUID, db: AsyncSession = Depends(get_db)) -> List[GettingCommentForUser]:
+async def get_user_comments(user_id: UUID, response: Response, page: PageParams = Depends(page_params),
+                            db: AsyncSession = Depends(get_db)) -> List[GettingCommentForUser]:
     try:
-        return await get_comments_for_user(user_id, db)
+        comments = await get_comments_for_user(user_id, db, page)
+        set_next_cursor(response, comments)
+        return comments.items
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
@@ -5,6 +5,7 @@ from sqlalchemy import insert, delete, select, UUID
 from datetime import datetime
 from src.comment.model import comment, comment_user, comment_item
 from src.comment.schema import CreatingComment, GettingCommentForItem, GettingCommentForUser
+from src.pagination import Page, PageParams, apply_keyset, split_page
 
 
 async def create_comment_for_item(item_id: int, comment_data: CreatingComment, db: AsyncSession) -> Optional[GettingCommentForItem]:
@@ -15,7 +16,6 @@ async def create_comment_for_item(item_id: int, comment_data: CreatingComment, d
             date=datetime.utcnow()
         ).returning(comment.c.id, comment.c.value, comment.c.body, comment.c.date)
         result = await db.execute(stmt)
-        await db.commit()
 
         comment_row = result.fetchone()
 
@@ -25,7 +25,6 @@ async def create_comment_for_item(item_id: int, comment_data: CreatingComment, d
                 item_id=item_id
             )
             await db.execute(stmt_item)
-            await db.commit()
 
             return GettingCommentForItem(
                 id=comment_row.id,
@@ -49,7 +48,6 @@ async def create_comment_for_user(user_id: UUID, comment_data: CreatingComment,
             date=datetime.utcnow()
         ).returning(comment.c.id, comment.c.value, comment.c.body, comment.c.date)
         result = await db.execute(stmt)
-        await db.commit()
 
         comment_row = result.fetchone()
 
@@ -59,7 +57,6 @@ async def create_comment_for_user(user_id: UUID, comment_data: CreatingComment,
                 user_id=user_id
             )
             await db.execute(stmt_user)
-            await db.commit()
 
             return GettingCommentForUser(
                 id=comment_row.id,
@@ -75,13 +72,18 @@ async def create_comment_for_user(user_id: UUID, comment_data: CreatingComment,
         raise e
 
 
-async def get_comments_for_item(item_id: int, db: AsyncSession) -> List[GettingCommentForItem]:
+async def get_comments_for_item(item_id: int, db: AsyncSession,
+                                page: Optional[PageParams] = None) -> Page[GettingCommentForItem]:
     try:
-        stmt = select(comment.c.id, comment.c.value, comment.c.body, comment.c.date).join(comment_item).where(comment_item.c.item_id == item_id)
+        # Newest first, keyset on (date, id)
+        stmt = apply_keyset(
+            select(comment.c.id, comment.c.value, comment.c.body, comment.c.date).join(comment_item).where(comment_item.c.item_id == item_id),
+            [comment.c.date, comment.c.id], page, descending=True
+        )
         result = await db.execute(stmt)
-        comments = result.fetchall()
+        comments, next_cursor = split_page(result.fetchall(), page, key=lambda row: (row.date, row.id))
 
-        return [
+        items = [
             GettingCommentForItem(
                 id=row.id,
                 stars=row.value,
@@ -92,18 +94,25 @@ async def get_comments_for_item(item_id: int, db: AsyncSession) -> List[GettingC
             for row in comments
         ]
 
+        return Page(items=items, next_cursor=next_cursor)
+
     except SQLAlchemyError as e:
         print(f"Error retrieving comments for item: {e}")
         raise e
 
 
-async def get_comments_for_user(user_id: UUID, db: AsyncSession) -> List[GettingCommentForUser]:
+async def get_comments_for_user(user_id: UUID, db: AsyncSession,
+                                page: Optional[PageParams] = None) -> Page[GettingCommentForUser]:
     try:
-        stmt = select(comment.c.id, comment.c.value, comment.c.body, comment.c.date).join(comment_user).where(comment_user.c.user_id == user_id)
+        # Newest first, keyset on (date, id)
+        stmt = apply_keyset(
+            select(comment.c.id, comment.c.value, comment.c.body, comment.c.date).join(comment_user).where(comment_user.c.user_id == user_id),
+            [comment.c.date, comment.c.id], page, descending=True
+        )
         result = await db.execute(stmt)
-        comments = result.fetchall()
+        comments, next_cursor = split_page(result.fetchall(), page, key=lambda row: (row.date, row.id))
 
-        return [
+        items = [
             GettingCommentForUser(
                 id=row.id,
                 stars=row.value,
@@ -114,6 +123,8 @@ async def get_comments_for_user(user_id: UUID, db: AsyncSession) -> List[Getting
             for row in comments
         ]
 
+        return Page(items=items, next_cursor=next_cursor)
+
     except SQLAlchemyError as e:
         print(f"Error retrieving comments for user: {e}")
         raise e
@@ -126,7 +137,6 @@ async def delete_comment(comment_id: int, db: AsyncSession) -> bool:
 
         stmt = delete(comment).where(comment.c.id == comment_id)
         result = await db.execute(stmt)
-        await db.commit()
 
         return result.rowcount > 0
 
@@ -19,3 +19,44 @@ DB_PORT_TEST = os.getenv("DB_PORT_TEST")
 SECRET_AUTH = os.getenv("SECRET_AUTH")
 
 PREFERENCE_MAX_VALUE = os.getenv("PREFERENCE_MAX_VALUE")
+
+DB_POOL_ENABLED = os.getenv("DB_POOL_ENABLED", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", 100))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", 1000))
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.getenv("CACHE_TTL", 30))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() == "true"
+
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", 5000))
+
+EVENT_BATCH_MAX_SIZE = int(os.getenv("EVENT_BATCH_MAX_SIZE", 1000))
+
+AKCE_LOCK_RETRIES = int(os.getenv("AKCE_LOCK_RETRIES", 3))
+
+BACKTEST_MAX_DAYS = int(os.getenv("BACKTEST_MAX_DAYS", 366))
+BACKTEST_CHUNK_SIZE = int(os.getenv("BACKTEST_CHUNK_SIZE", 50000))
+
+EVENT_SCHEDULE_MAX_SLEEP = float(os.getenv("EVENT_SCHEDULE_MAX_SLEEP", 60))
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", 3600))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", 10000))
+
+ORDER_GROUP_COMMIT = os.getenv("ORDER_GROUP_COMMIT", "false").lower() == "true"
+ORDER_GROUP_COMMIT_MAX_BATCH = int(os.getenv("ORDER_GROUP_COMMIT_MAX_BATCH", 100))
+ORDER_GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("ORDER_GROUP_COMMIT_MAX_DELAY_MS", 5))
+
+ORDER_PARTITION_MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", 2))
+ORDER_PARTITION_CHECK_INTERVAL = int(os.getenv("ORDER_PARTITION_CHECK_INTERVAL", 86400))
+
+REPORT_REFRESH_INTERVAL = int(os.getenv("REPORT_REFRESH_INTERVAL", 300))
@@ -1,21 +1,147 @@
-from typing import AsyncGenerator
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional
 import asyncpg
 from sqlalchemy import MetaData, NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-from src.config import DB_HOST, DB_NAME, DB_PASS, DB_USER, DB_PORT
+from src.config import DB_HOST, DB_NAME, DB_PASS, DB_USER, DB_PORT, DB_POOL_ENABLED, DB_POOL_SIZE, \
+    DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 Base = declarative_base()
 
 metadata = MetaData()
 
-engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+
+class PoolWaitStats:
+    """
+    Time spent by this worker waiting for a connection from the pool
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.acquired += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueue(AsyncAdaptedQueue):
+    """
+    Queue of idle pooled connections timing every get. Only the wait for a connection
+    to be returned is measured: opening a new overflow connection and the pre-ping
+    happen outside of the queue
+    """
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            pool_wait_stats.record(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    _queue_class = TimedQueue
+
+
+def _engine_options() -> dict:
+    if not DB_POOL_ENABLED:
+        return {"poolclass": NullPool}
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_POOL_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_async_engine(DATABASE_URL, **_engine_options())
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@asynccontextmanager
+async def unit_of_work(session_maker: sessionmaker = None) -> AsyncIterator[AsyncSession]:
+    """
+    One transaction for everything executed through the session: services only run
+    statements, the work is committed once on success and rolled back on any error
+    """
+    async with (session_maker or async_session_maker)() as session:
+        try:
+            yield session
+        except Exception:
+            session.info.pop("on_commit", None)
+            await session.rollback()
+            raise
+        else:
+            await session.commit()
+            for callback in session.info.pop("on_commit", []):
+                # Работа уже закоммичена: ошибка колбэка не должна выглядеть как неудавшаяся транзакция
+                try:
+                    await callback()
+                except Exception as e:
+                    print(f"on_commit callback failed after commit: {e}")
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Runs the callback after the unit of work owning the session has committed. A failing
+    callback is logged and does not fail the unit of work, the commit already happened
+    """
+    session.info.setdefault("on_commit", []).append(callback)
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with unit_of_work() as session:
         yield session
+
+
+def get_pool_stats() -> dict:
+    """
+    Snapshot of the connection pool of the current uvicorn worker
+    """
+    pool = engine.pool
+    stats = {
+        "worker_pid": os.getpid(),
+        "pooled": DB_POOL_ENABLED,
+        "pool_class": type(pool).__name__,
+    }
+
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow(),
+            acquired=pool_wait_stats.acquired,
+            total_wait_ms=pool_wait_stats.total_wait * 1000,
+            avg_wait_ms=(pool_wait_stats.total_wait / pool_wait_stats.acquired * 1000)
+            if pool_wait_stats.acquired else 0.0,
+            max_wait_ms=pool_wait_stats.max_wait * 1000,
+        )
+
+    return stats
+
+
+async def dispose_engine() -> None:
+    await engine.dispose()
@@ -5,14 +5,15 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from database import get_session
+from src.database import get_session
 from src.auth.models import User, role
 from src.auth.base_config import current_active_user
 
 
-async def get_db() -> AsyncSession:
-    async for session in get_session():
-        yield session
+# The user manager (src.auth.utils.get_user_db), permission checks and routes all
+# depend on the same callable, so FastAPI's per-request dependency cache hands them
+# one session. AsyncSession checks out a connection only on its first statement.
+get_db = get_session
 
 
 def permission_dependency(permission_name: str = None, goal_user_id: UUID = None):
@@ -34,16 +35,9 @@ async def check_permission(permission_name: str = None, goal_id: UUID = None,
     if permission_name is None:
         return user
 
-    # Retrieve the user by their ID
-    user_stmt = select(User).filter(User.id == user.id)
-    user_result = await db.execute(user_stmt)
-    user_data = user_result.scalar_one_or_none()
-
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Retrieve the role using role_id from user_data
-    role_stmt = select(role.c.id, role.c.permissions).filter(role.c.id == user_data.role_id)
+    # The user was already loaded by fastapi-users through this same session,
+    # so only the role has to be fetched
+    role_stmt = select(role.c.id, role.c.permissions).filter(role.c.id == user.role_id)
     role_result = await db.execute(role_stmt)
     role_data = role_result.fetchone()
 
@@ -57,4 +51,4 @@ async def check_permission(permission_name: str = None, goal_id: UUID = None,
     if permission_name not in role_permissions or goal_id == user.id:
         raise HTTPException(status_code=403, detail="Access forbidden: insufficient permissions")
 
-    return user_data
+    return user
@@ -0,0 +1,214 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.card.model import bonus_card
+from src.config import BACKTEST_CHUNK_SIZE
+from src.event.benefit.model import Activity
+from src.event.criterion.model import Contrast
+from src.event.schema import CreatingEvent, BacktestResult
+from src.order.model import order, order_item
+
+
+class OrderColumns:
+    """
+    Historical orders as parallel NumPy arrays, one position per order. Only the lines
+    of the items the criteria look for are kept, as two flat arrays mapping every such
+    line to the position of its order
+    """
+
+    def __init__(self, cost: np.ndarray, card_count: np.ndarray, used_points: np.ndarray, has_card: np.ndarray,
+                 line_count: np.ndarray, line_order: np.ndarray, line_item: np.ndarray):
+        self.cost = cost
+        self.card_count = card_count
+        self.used_points = used_points
+        self.has_card = has_card
+        self.line_count = line_count
+        self.line_order = line_order
+        self.line_item = line_item
+
+    def __len__(self) -> int:
+        return len(self.cost)
+
+
+# Vectorized counterparts of contrast_operations and benefit_operations from src.event.utis
+def greater_for_count_points(orders: OrderColumns, card_count, used_points, value: float) -> np.ndarray:
+    return card_count > value
+
+
+def greater_for_all_points(orders: OrderColumns, card_count, used_points, value: float) -> np.ndarray:
+    return card_count + used_points > value
+
+
+def check_items_count_in_order(orders: OrderColumns, card_count, used_points, value: float) -> np.ndarray:
+    return orders.line_count >= value
+
+
+def check_define_item_in_order(orders: OrderColumns, card_count, used_points, value: float) -> np.ndarray:
+    present = np.zeros(len(orders), dtype=bool)
+    present[orders.line_order[orders.line_item == value]] = True
+    return present
+
+
+vector_contrast_operations = {
+    Contrast.greater_than: greater_for_count_points,
+    Contrast.greater_for_all: greater_for_all_points,
+    Contrast.count_items_in_order: check_items_count_in_order,
+    Contrast.define_item_in_order: check_define_item_in_order,
+}
+
+
+def add_point_to_card(cost, card_count, used_points, value: float):
+    return cost, card_count + value, used_points
+
+
+def reduce_bonuses_on_count(cost, card_count, used_points, value: float):
+    return cost, card_count - value, used_points + value
+
+
+def reduce_sum_of_order_for_value(cost, card_count, used_points, value: float):
+    return cost - value, card_count, used_points
+
+
+def reduce_sum_of_order_for_percent(cost, card_count, used_points, value: float):
+    return cost * (1 - value / 100), card_count, used_points
+
+
+vector_benefit_operations = {
+    Activity.add_cart_bonuses: add_point_to_card,
+    Activity.reduce_card_bonuses: reduce_bonuses_on_count,
+    Activity.reduce_order_sum: reduce_sum_of_order_for_value,
+    Activity.reduce_order_sum_percent: reduce_sum_of_order_for_percent,
+}
+
+
+def evaluate_event(event_data: CreatingEvent, orders: OrderColumns) -> BacktestResult:
+    """
+    Applies the event to every order at once, as if it had been redeemed on each order
+    whose card satisfied its criteria. Benefits are chained like in use_akce
+    """
+    if not len(orders):
+        return BacktestResult(orders=0, redemptions=0, redemption_rate=0.0, discount_total=0.0,
+                              points_awarded=0.0, points_spent=0.0)
+
+    # use_akce refuses orders without a bonus card
+    eligible = orders.has_card.copy()
+    for rule in event_data.criteria or []:
+        eligible &= vector_contrast_operations[rule.contrast](orders, orders.card_count, orders.used_points, rule.value)
+
+    cost, card_count, used_points = orders.cost[eligible], orders.card_count[eligible], orders.used_points[eligible]
+    for rule in event_data.benefits or []:
+        cost, card_count, used_points = vector_benefit_operations[rule.action](cost, card_count, used_points, rule.value)
+        # Как CompiledRule.apply: баллы округляются после каждого бонуса
+        card_count, used_points = np.rint(card_count), np.rint(used_points)
+
+    redemptions = int(eligible.sum())
+    point_delta = card_count - orders.card_count[eligible]
+    return BacktestResult(
+        orders=len(orders),
+        redemptions=redemptions,
+        redemption_rate=redemptions / len(orders),
+        discount_total=float((orders.cost[eligible] - cost).sum()),
+        points_awarded=float(point_delta[point_delta > 0].sum()),
+        points_spent=float((used_points - orders.used_points[eligible]).sum())
+    )
+
+
+def _column(rows: list, position: int, dtype) -> np.ndarray:
+    return np.fromiter((row[position] for row in rows), dtype=dtype, count=len(rows))
+
+
+def _concat(chunks: List[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+
+def criteria_item_ids(event_data: CreatingEvent) -> List[int]:
+    return sorted({int(rule.value) for rule in event_data.criteria or []
+                   if rule.contrast == Contrast.define_item_in_order})
+
+
+async def load_order_columns(db: AsyncSession, date_from: date, date_to: date,
+                             item_ids: Iterable[int] = ()) -> OrderColumns:
+    """
+    Orders of the period with their line count and the current balance of their owner's
+    card, streamed in chunks of BACKTEST_CHUNK_SIZE rows straight into NumPy arrays.
+    Historical balances are not stored, so the card columns reflect today's points:
+    BacktestForm refuses the criteria reading them, the balances only carry the point
+    benefits, whose totals are differences
+    """
+    try:
+        period = (
+            order.c.date >= datetime.combine(date_from, datetime.min.time()),
+            order.c.date < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+        )
+
+        # Одна карта на пользователя, как в get_card_by_user
+        cards = (
+            select(bonus_card.c.user_id, bonus_card.c.count, bonus_card.c.used_points)
+            .distinct(bonus_card.c.user_id)
+            .order_by(bonus_card.c.user_id, bonus_card.c.id)
+            .subquery("cards")
+        )
+        # Lines are counted in the database, only the number per order is transferred
+        line_counts = (
+            select(order_item.c.order_id, func.count().label("lines"))
+            .select_from(order.join(order_item, order_item.c.order_id == order.c.id))
+            .where(*period)
+            .group_by(order_item.c.order_id)
+            .subquery("line_counts")
+        )
+        order_stmt = (
+            select(order.c.id, order.c.cost, func.coalesce(cards.c.count, 0), func.coalesce(cards.c.used_points, 0),
+                   cards.c.user_id.is_not(None), func.coalesce(line_counts.c.lines, 0))
+            .select_from(
+                order.outerjoin(cards, cards.c.user_id == order.c.user_id)
+                .outerjoin(line_counts, line_counts.c.order_id == order.c.id)
+            )
+            .where(*period)
+            .execution_options(yield_per=BACKTEST_CHUNK_SIZE)
+        )
+
+        columns = ((np.int64, []), (np.float64, []), (np.float64, []), (np.float64, []), (bool, []), (np.int64, []))
+        result = await db.stream(order_stmt)
+        async for rows in result.partitions():
+            for position, (dtype, chunks) in enumerate(columns):
+                chunks.append(_column(rows, position, dtype))
+        order_ids, cost, card_count, used_points, has_card, line_count = (
+            _concat(chunks, dtype) for dtype, chunks in columns
+        )
+
+        item_ids = list(item_ids)
+        line_rows = []
+        if item_ids:
+            line_rows = (await db.execute(
+                select(order_item.c.order_id, order_item.c.item_id)
+                .select_from(order.join(order_item, order_item.c.order_id == order.c.id))
+                .where(*period, order_item.c.item_id.in_(item_ids))
+            )).all()
+
+        # Rows come unordered, positions of the line orders are found through a sort of the ids
+        sorter = np.argsort(order_ids)
+        line_order_ids = _column(line_rows, 0, np.int64)
+        return OrderColumns(
+            cost=cost,
+            card_count=card_count,
+            used_points=used_points,
+            has_card=has_card,
+            line_count=line_count,
+            line_order=sorter[np.searchsorted(order_ids, line_order_ids, sorter=sorter)],
+            line_item=_column(line_rows, 1, np.int64)
+        )
+
+    except SQLAlchemyError as e:
+        print(f"Database error while loading orders for backtest: {e}")
+        raise e
+
+
+async def backtest_event(event_data: CreatingEvent, db: AsyncSession, date_from: date,
+                         date_to: date) -> BacktestResult:
+    orders = await load_order_columns(db, date_from, date_to, criteria_item_ids(event_data))
+    return evaluate_event(event_data, orders)
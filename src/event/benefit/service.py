@@ -15,9 +15,8 @@ async def create_benefit(benefit_data: Benefit, db: AsyncSession) -> GettingBene
             action_value=benefit_data.value
         ).returning(benefit_table.c.id, benefit_table.c.action, benefit_table.c.action_value)
 
-        # Выполняем запрос и коммитим изменения
+        # Выполняем запрос
         result = await db.execute(stmt)
-        await db.commit()
 
         # Получаем данные новой записи
         benefit_row = result.fetchone()
@@ -44,9 +43,8 @@ async def delete_benefit(benefit_id: int, db: AsyncSession) -> None:
         # Формируем SQL запрос на удаление записи по id
         stmt = delete(benefit_table).where(benefit_table.c.id == benefit_id)
 
-        # Выполняем запрос и коммитим изменения
+        # Выполняем запрос
         result = await db.execute(stmt)
-        await db.commit()
 
         # Если строка не была удалена, поднимаем исключение
         if result.rowcount == 0:
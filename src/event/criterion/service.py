@@ -18,7 +18,6 @@ async def create_criterion(criterion: Criterion, db: AsyncSession) -> GettingCri
 
         # Выполняем запрос
         result = await db.execute(stmt)
-        await db.commit()
 
         # Получаем данные новой записи
         criterion_row = result.fetchone()
@@ -46,7 +45,6 @@ async def delete_criterion(criterion_id: int, db: AsyncSession) -> None:
 
         # Выполняем запрос
         result = await db.execute(stmt)
-        await db.commit()
 
         if result.rowcount == 0:
             raise ValueError(f"Criterion with id {criterion_id} not found")
@@ -1,5 +1,5 @@
 from sqlalchemy import Table, Column, Integer, String, TIMESTAMP, ForeignKey, JSON, BigInteger, Double, \
-    Boolean, PrimaryKeyConstraint, UUID
+    Boolean, PrimaryKeyConstraint, UUID, Index, text
 from ..database import metadata
 
 event = Table(
@@ -8,7 +8,14 @@ event = Table(
     Column("id", BigInteger, primary_key=True, autoincrement=True),
     Column("title", String, nullable=False),
     Column("description", String),
-    Column("is_active", Boolean, default=True)
+    Column("is_active", Boolean, default=True),
+    # Optional activity window, is_active is switched by the scheduler at its boundaries
+    Column("starts_at", TIMESTAMP),
+    Column("ends_at", TIMESTAMP),
+    # Keyset scan of the active events without reading the inactive ones
+    Index("ix_event_active_id", "id", postgresql_where=text("is_active")),
+    Index("ix_event_starts_at", "starts_at", postgresql_where=text("starts_at IS NOT NULL")),
+    Index("ix_event_ends_at", "ends_at", postgresql_where=text("ends_at IS NOT NULL"))
 )
 
 criterion_event = Table(
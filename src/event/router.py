@@ -1,14 +1,19 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
-from src.event.schema import CreatingEvent, GettingEvent
-from src.event.service import create_event, get_all_events, get_active_events, delete_event
+from src.pagination import PageParams, page_params, set_next_cursor
+from src.responses import trusted_json
+from src.event.schema import CreatingEvent, CreatingEventBatch, GettingEvent, EligibleAkce, BacktestForm, \
+    BacktestResult
+from src.event.backtest import backtest_event
+from src.event.service import create_event, create_events, get_all_events, get_active_events, delete_event, \
+    get_eligible_akce
 
 router = APIRouter(
     prefix="/akce",
@@ -19,16 +24,42 @@ router = APIRouter(
 async def create_new_akce(event: CreatingEvent,
                           db: AsyncSession = Depends(get_db),
                           user: User = Depends(permission_dependency("create_event"))) -> GettingEvent:
+    """
+    Other workers apply the change to redemptions within CACHE_TTL seconds, at once
+    when the catalog cache runs on Redis
+    """
     created_event = await create_event(event, db)
     if not created_event:
         raise HTTPException(status_code=400, detail="Failed to create akce")
     return created_event
 
 
+@router.post("/batch", response_model=List[GettingEvent])
+async def create_akce_batch(batch: CreatingEventBatch,
+                            db: AsyncSession = Depends(get_db),
+                            user: User = Depends(permission_dependency("create_event"))) -> List[GettingEvent]:
+    """
+    Other workers apply the change to redemptions within CACHE_TTL seconds, at once
+    when the catalog cache runs on Redis
+    """
+    # Whole seasonal catalog in one transaction: either every akce is created or none
+    return trusted_json(await create_events(batch.events, db))
+
+
+@router.post("/backtest", response_model=BacktestResult)
+async def backtest_akce(form: BacktestForm, db: AsyncSession = Depends(get_db),
+                        user: User = Depends(permission_dependency("get_reports"))) -> BacktestResult:
+    # What the akce would have cost over the period, nothing is written
+    return await backtest_event(form.event, db, form.date_from, form.date_to)
+
+
 @router.get("", response_model=List[GettingEvent])
-async def get_active_akce(db: AsyncSession = Depends(get_db)) -> List[GettingEvent]:
+async def get_active_akce(response: Response, page: PageParams = Depends(page_params),
+                          db: AsyncSession = Depends(get_db)) -> List[GettingEvent]:
     try:
-        return await get_active_events(db)
+        events = await get_active_events(db, page)
+        set_next_cursor(response, events)
+        return trusted_json(events.items, response)
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
@@ -37,7 +68,18 @@ async def get_active_akce(db: AsyncSession = Depends(get_db)) -> List[GettingEve
 async def get_all_akce(db: AsyncSession = Depends(get_db),
                        user: User = Depends(permission_dependency("get_events"))) -> List[GettingEvent]:
     try:
-        return await get_all_events(db)
+        return trusted_json(await get_all_events(db))
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+
+
+@router.get("/eligible", response_model=List[EligibleAkce])
+async def get_eligible_akce_for_order(order_id: int, card_id: int,
+                                      db: AsyncSession = Depends(get_db)) -> List[EligibleAkce]:
+    try:
+        return await get_eligible_akce(order_id, card_id, db)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
@@ -45,4 +87,8 @@ async def get_all_akce(db: AsyncSession = Depends(get_db),
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_akce(event_id: int, db: AsyncSession = Depends(get_db),
                       user: User = Depends(permission_dependency("delete_event"))) -> None:
+    """
+    Other workers apply the change to redemptions within CACHE_TTL seconds, at once
+    when the catalog cache runs on Redis
+    """
     await delete_event(event_id, db)
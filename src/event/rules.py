@@ -0,0 +1,139 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.cache import ResponseCache, catalog_cache
+from src.card.schema import GettingCard
+from src.event.benefit.model import Activity
+from src.event.criterion.model import Contrast
+from src.event.schema import GettingEvent
+from src.event.utis import BenefitResult, benefit_operations, contrast_operations
+from src.order.schema import GettingOrder
+
+
+class CompiledRule:
+    """
+    One active event with its criteria and benefits resolved to the functions of
+    src.event.utis, ready to be evaluated without touching the database
+    """
+
+    def __init__(self, event_id: int, title: str, description: Optional[str],
+                 criteria: Iterable[Tuple[Contrast, float]], benefits: Iterable[Tuple[Activity, float]]):
+        self.event_id = event_id
+        self.title = title
+        self.description = description
+        self.checks: Tuple[Tuple[Callable, Contrast, float], ...] = tuple(
+            (contrast_operations[contrast], contrast, value) for contrast, value in criteria
+        )
+        self.effects: Tuple[Tuple[Callable, float], ...] = tuple(
+            (benefit_operations[action], value) for action, value in benefits
+        )
+
+    def failed_check(self, order: GettingOrder, card: GettingCard) -> Optional[Tuple[Contrast, float]]:
+        for check, contrast, value in self.checks:
+            if not check(order, card, value):
+                return contrast, value
+        return None
+
+    def apply(self, order: GettingOrder, card: GettingCard) -> Tuple[GettingOrder, GettingCard]:
+        """
+        Every benefit works on the result of the previous one. Points are rounded to
+        the nearest whole point after each benefit, the card columns are integers
+        """
+        for effect, value in self.effects:
+            result: BenefitResult = effect(order, card, value)
+            order = order.model_copy(update={"cost": result.total_cost})
+            card = card.model_copy(update={"count": round(result.card_value),
+                                           "used_points": round(result.used_points)})
+        return order, card
+
+
+class RuleSet:
+    def __init__(self, rules: Iterable[CompiledRule]):
+        self.rules: Dict[int, CompiledRule] = {rule.event_id: rule for rule in rules}
+
+    @classmethod
+    def compile(cls, events: Iterable[GettingEvent]) -> "RuleSet":
+        return cls(
+            CompiledRule(
+                akce.id, akce.title, akce.description,
+                [(rule.contrast, rule.value) for rule in akce.criteria],
+                [(rule.action, rule.value) for rule in akce.benefits]
+            )
+            for akce in events
+        )
+
+    def redeem(self, akce_ids: List[int], order: GettingOrder,
+               card: GettingCard) -> Tuple[GettingOrder, GettingCard]:
+        """
+        Applies the requested events one after another. Criteria are checked against the
+        order and card as they were before any event, benefits are chained. Only active
+        events can be redeemed
+        """
+        for akce_id in akce_ids:
+            rule = self.rules.get(akce_id)
+            if rule is None:
+                raise ValueError(f"Active event with ID {akce_id} not found.")
+
+            failed = rule.failed_check(order, card)
+            if failed:
+                raise ValueError(f"Card or order does not satisfy {failed[0].value} {failed[1]} for akce {rule.title}")
+
+        for akce_id in akce_ids:
+            order, card = self.rules[akce_id].apply(order, card)
+        return order, card
+
+    def eligible(self, order: GettingOrder,
+                 card: GettingCard) -> List[Tuple[CompiledRule, GettingOrder, GettingCard]]:
+        """
+        Every rule the order and card satisfy, each with the order and card it would
+        produce when applied alone
+        """
+        return [
+            (rule, *rule.apply(order, card))
+            for rule in self.rules.values()
+            if rule.failed_check(order, card) is None
+        ]
+
+
+class CompiledRuleSetHolder:
+    """
+    The compiled RuleSet kept in this worker's memory. It is rebuilt only when the
+    "events" namespace of the catalog cache is invalidated, which create_event,
+    delete_event and the activation scheduler do after their commit. With a backend
+    sharing versions that is the only check; otherwise the other workers' changes
+    are only noticed after max_age seconds, CACHE_TTL by default, like the entries
+    of MemoryCacheBackend. The event write endpoints document that window
+    """
+
+    def __init__(self, cache: ResponseCache, namespace: str = "events", max_age: Optional[float] = None):
+        self.cache = cache
+        self.namespace = namespace
+        self.max_age = cache.ttl if max_age is None else max_age
+        self._rule_set: Optional[RuleSet] = None
+        self._version = None
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self, version) -> bool:
+        if self._rule_set is None or version != self._version:
+            return False
+        return self.cache.backend.shared_versions or time.monotonic() - self._built_at < self.max_age
+
+    async def get(self, loader: Callable[[], Awaitable[RuleSet]]) -> RuleSet:
+        version = await self.cache.version(self.namespace)
+        if self._is_fresh(version):
+            return self._rule_set
+
+        # Одна перекомпиляция на воркер, остальные запросы ждут её результат
+        async with self._lock:
+            version = await self.cache.version(self.namespace)
+            if not self._is_fresh(version):
+                # The version is read before loading: an invalidation during the load triggers another rebuild
+                self._rule_set = await loader()
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._rule_set
+
+
+compiled_rules = CompiledRuleSetHolder(catalog_cache)
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, func, and_, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import catalog_cache
+from src.config import EVENT_SCHEDULE_MAX_SLEEP
+from src.database import unit_of_work
+from src.event.model import event
+
+
+def is_within_window(starts_at: Optional[datetime], ends_at: Optional[datetime], now: datetime) -> bool:
+    return (starts_at is None or starts_at <= now) and (ends_at is None or now < ends_at)
+
+
+def _window_open(now: datetime):
+    return and_(
+        or_(event.c.starts_at.is_(None), event.c.starts_at <= now),
+        or_(event.c.ends_at.is_(None), event.c.ends_at > now)
+    )
+
+
+async def sync_event_activation(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """
+    Switches is_active of the events with a window to match it. Events without
+    starts_at and ends_at keep their manual flag
+    """
+    now = now or datetime.utcnow()
+    windowed = or_(event.c.starts_at.is_not(None), event.c.ends_at.is_not(None))
+
+    try:
+        activated = await db.execute(
+            update(event).where(windowed, _window_open(now), event.c.is_active.is_not(True)).values(is_active=True)
+        )
+        deactivated = await db.execute(
+            update(event).where(windowed, ~_window_open(now), event.c.is_active.is_not(False)).values(is_active=False)
+        )
+
+        changed = activated.rowcount + deactivated.rowcount
+        if changed:
+            catalog_cache.mark_stale(db, "events")
+        return changed
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while switching event activation: {e}")
+        raise e
+
+
+async def next_event_boundary(db: AsyncSession, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    The nearest starts_at or ends_at after now, both lookups are served by the
+    partial indexes on those columns
+    """
+    now = now or datetime.utcnow()
+    try:
+        next_start = (await db.execute(select(func.min(event.c.starts_at)).where(event.c.starts_at > now))).scalar()
+        next_end = (await db.execute(select(func.min(event.c.ends_at)).where(event.c.ends_at > now))).scalar()
+        boundaries = [moment for moment in (next_start, next_end) if moment is not None]
+        return min(boundaries) if boundaries else None
+
+    except SQLAlchemyError as e:
+        print(f"Error occurred while looking up the next event boundary: {e}")
+        raise e
+
+
+async def schedule_event_activation_periodically() -> None:
+    """
+    Lifespan task sleeping until the next window boundary, at most
+    EVENT_SCHEDULE_MAX_SLEEP seconds so newly created windows are picked up
+    """
+    boundary: Optional[datetime] = None
+    while True:
+        try:
+            async with unit_of_work() as db:
+                changed = await sync_event_activation(db)
+                # Другой воркер мог уже переключить флаг, но кэш этого воркера всё равно устарел
+                if not changed and boundary is not None and boundary <= datetime.utcnow():
+                    await catalog_cache.invalidate("events")
+                boundary = await next_event_boundary(db)
+            if changed:
+                print(f"Switched activation of {changed} events")
+        except Exception as e:
+            print(f"Event activation scheduling failed: {e}")
+            boundary = None
+
+        delay = EVENT_SCHEDULE_MAX_SLEEP
+        if boundary is not None:
+            delay = min(delay, max((boundary - datetime.utcnow()).total_seconds(), 0))
+        await asyncio.sleep(delay)
@@ -1,7 +1,11 @@
+from datetime import date, datetime, timezone
 from typing import Optional, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
+from src.config import EVENT_BATCH_MAX_SIZE, BACKTEST_MAX_DAYS
+
+from src.event.criterion.model import Contrast
 from src.event.criterion.schema import Criterion, GettingCriterion
 from src.event.benefit.schema import Benefit, GettingBenefit
 
@@ -11,6 +15,20 @@ class CreatingEvent(BaseModel):
     description: Optional[str] = None
     criteria: Optional[List[Criterion]] = []
     benefits: Optional[List[Benefit]] = []
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_window(self):
+        # Окно хранится в наивном UTC, как и остальные метки времени
+        for field in ("starts_at", "ends_at"):
+            moment = getattr(self, field)
+            if moment is not None and moment.tzinfo is not None:
+                setattr(self, field, moment.astimezone(timezone.utc).replace(tzinfo=None))
+
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be later than starts_at")
+        return self
 
 
 class GettingEvent(CreatingEvent):
@@ -22,7 +40,53 @@ class GettingEvent(CreatingEvent):
     benefits: Optional[List[Benefit]] = []
 
 
+class CreatingEventBatch(BaseModel):
+    events: List[CreatingEvent] = Field(..., min_length=1, max_length=EVENT_BATCH_MAX_SIZE)
+
+
 class UseAkcesForm(BaseModel):
     card_id: int
     order_id: int
     akce_ids: List[int]
+
+
+class EligibleAkce(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    order_cost: float
+    card_count: int
+    used_points: int
+
+
+# Criteria reading the card balance, which is only known as of today
+BALANCE_CONTRASTS = (Contrast.greater_than, Contrast.greater_for_all)
+
+
+class BacktestForm(BaseModel):
+    event: CreatingEvent
+    date_from: date
+    date_to: date
+
+    @model_validator(mode="after")
+    def check_period(self):
+        if self.date_to < self.date_from:
+            raise ValueError("date_to must not be earlier than date_from")
+        if (self.date_to - self.date_from).days >= BACKTEST_MAX_DAYS:
+            raise ValueError(f"Backtest period is limited to {BACKTEST_MAX_DAYS} days")
+
+        # Баланс карты на момент заказа не хранится, по сегодняшнему результат был бы выдуман
+        point_criteria = sorted({rule.contrast.value for rule in self.event.criteria or []
+                                 if rule.contrast in BALANCE_CONTRASTS})
+        if point_criteria:
+            raise ValueError(f"Criteria on card points cannot be backtested: {', '.join(point_criteria)}")
+        return self
+
+
+class BacktestResult(BaseModel):
+    orders: int
+    redemptions: int
+    redemption_rate: float
+    discount_total: float
+    points_awarded: float
+    points_spent: float
@@ -1,86 +1,119 @@
-from typing import List
+import asyncio
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from sqlalchemy import insert, delete, select
+from sqlalchemy import delete, select, func, literal_column
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError, DBAPIError
 
 from src.card.schema import GettingCard
-from src.event.benefit.schema import GettingBenefit
-from src.event.criterion.schema import GettingCriterion
-from src.event.benefit.model import benefit
-from src.event.criterion.model import criterion
+from src.event.benefit.schema import Benefit
+from src.event.criterion.schema import Criterion
+from src.event.benefit.model import Activity, benefit
+from src.event.criterion.model import Contrast, criterion
 from src.event.model import event, criterion_event, benefit_event
-from src.event.schema import CreatingEvent, GettingEvent, UseAkcesForm
-from src.event.criterion.service import create_criterion, delete_criterion
-from src.event.benefit.service import create_benefit, delete_benefit
-from src.event.utis import benefit_operations, contrast_operations
+from src.event.schema import CreatingEvent, GettingEvent, UseAkcesForm, EligibleAkce
+from src.event.criterion.service import delete_criterion
+from src.event.benefit.service import delete_benefit
+from src.event.rules import RuleSet, compiled_rules
+from src.event.scheduler import is_within_window
 from src.order.schema import GettingOrder
 from src.card.service import get_card_by_id, update_card_count
 from src.order.service import get_order_by_id, update_order_total_price
+from src.pagination import Page, PageParams, apply_keyset, split_page
+from src.cache import catalog_cache, cache_key
+from src.config import AKCE_LOCK_RETRIES
 
 
-async def create_event(event_data: CreatingEvent, db: AsyncSession) -> GettingEvent:
+async def create_events(events_data: List[CreatingEvent], db: AsyncSession) -> List[GettingEvent]:
+    """
+    Inserts the events, their criteria, benefits and link rows with one multi-row
+    INSERT per table, all in the caller's transaction
+    """
     try:
-        # Вставляем событие без явного создания транзакции
-        stmt = insert(event).values(
-            title=event_data.title,
-            description=event_data.description,
-            is_active=True
-        ).returning(event.c.id, event.c.title, event.c.description, event.c.is_active)
-
-        result = await db.execute(stmt)
-        event_row = result.fetchone()
-
-        if not event_row:
-            raise ValueError("Failed to create event")
-
-        event_id = event_row.id
-
-        # Создание критериев
-        if event_data.criteria:
-            for criterion_data in event_data.criteria:
-                created_criterion = await create_criterion(criterion_data, db)
-
-                stmt = insert(criterion_event).values(
-                    event_id=event_id,
-                    criterion_id=created_criterion.id
-                )
-                await db.execute(stmt)
-
-        # Создание бенефитов
-        if event_data.benefits:
-            for benefit_data in event_data.benefits:
-                created_benefit = await create_benefit(benefit_data, db)
-
-                stmt = insert(benefit_event).values(
-                    event_id=event_id,
-                    benefit_id=created_benefit.id
-                )
-                await db.execute(stmt)
-
-        # Коммитим изменения в конце, если все прошло успешно
-        await db.commit()
-
-        # Возвращаем результат
-        return GettingEvent(
-            id=event_id,
-            title=event_row.title,
-            description=event_row.description,
-            is_active=event_row.is_active,
-            criteria=event_data.criteria or [],
-            benefits=event_data.benefits or []
-        )
+        if not events_data:
+            return []
+
+        now = datetime.utcnow()
+        activity = [is_within_window(event_data.starts_at, event_data.ends_at, now) for event_data in events_data]
+
+        event_rows = (await db.execute(
+            event.insert().returning(event.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    "title": event_data.title,
+                    "description": event_data.description,
+                    "is_active": is_active,
+                    "starts_at": event_data.starts_at,
+                    "ends_at": event_data.ends_at
+                }
+                for event_data, is_active in zip(events_data, activity)
+            ]
+        )).fetchall()
+        event_ids = [row.id for row in event_rows]
+        catalog_cache.mark_stale(db, "events")
+
+        # Критерии и бенефиты всех событий одним запросом на таблицу
+        criterion_owners = [
+            (event_id, criterion_data)
+            for event_id, event_data in zip(event_ids, events_data)
+            for criterion_data in event_data.criteria or []
+        ]
+        if criterion_owners:
+            criterion_rows = (await db.execute(
+                criterion.insert().returning(criterion.c.id, sort_by_parameter_order=True),
+                [{"contrast": data.contrast, "contrast_value": data.value} for _, data in criterion_owners]
+            )).fetchall()
+            await db.execute(criterion_event.insert(), [
+                {"event_id": event_id, "criterion_id": row.id}
+                for (event_id, _), row in zip(criterion_owners, criterion_rows)
+            ])
+
+        benefit_owners = [
+            (event_id, benefit_data)
+            for event_id, event_data in zip(event_ids, events_data)
+            for benefit_data in event_data.benefits or []
+        ]
+        if benefit_owners:
+            benefit_rows = (await db.execute(
+                benefit.insert().returning(benefit.c.id, sort_by_parameter_order=True),
+                [{"action": data.action, "action_value": data.value} for _, data in benefit_owners]
+            )).fetchall()
+            await db.execute(benefit_event.insert(), [
+                {"event_id": event_id, "benefit_id": row.id}
+                for (event_id, _), row in zip(benefit_owners, benefit_rows)
+            ])
+
+        return [
+            GettingEvent(
+                id=event_id,
+                title=event_data.title,
+                description=event_data.description,
+                is_active=is_active,
+                criteria=event_data.criteria or [],
+                benefits=event_data.benefits or [],
+                starts_at=event_data.starts_at,
+                ends_at=event_data.ends_at
+            )
+            for event_id, event_data, is_active in zip(event_ids, events_data, activity)
+        ]
 
     except IntegrityError as e:
         await db.rollback()
-        print(f"Integrity error while creating event: {e}")
+        print(f"Integrity error while creating events: {e}")
         raise e
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Database error while creating event: {e}")
+        print(f"Database error while creating events: {e}")
         raise e
 
 
+async def create_event(event_data: CreatingEvent, db: AsyncSession) -> GettingEvent:
+    created_events = await create_events([event_data], db)
+    return created_events[0]
+
+
 async def delete_event(event_id: int, db: AsyncSession) -> None:
     try:
         # Получаем все критерии, связанные с событием
@@ -107,8 +140,7 @@ async def delete_event(event_id: int, db: AsyncSession) -> None:
 
         if result.rowcount == 0:
             raise ValueError(f"Event with id {event_id} not found")
-
-        await db.commit()
+        catalog_cache.mark_stale(db, "events")
 
     except SQLAlchemyError as e:
         await db.rollback()
@@ -116,26 +148,69 @@ async def delete_event(event_id: int, db: AsyncSession) -> None:
         raise e
 
 
-async def get_active_events(db: AsyncSession) -> List[GettingEvent]:
-    try:
-        # SQL запрос для получения всех активных событий
-        stmt = select(event).where(event.c.is_active == True)
-        result = await db.execute(stmt)
+def _rules_json(table, link_table, link_column, kind_column, value_column, kind_name: str):
+    # Правила события одним JSON-массивом прямо в строке события
+    rules = func.json_agg(aggregate_order_by(
+        func.json_build_object(kind_name, kind_column, "value", value_column), table.c.id
+    ))
+    return (
+        select(func.coalesce(rules, literal_column("'[]'::json"), type_=JSON))
+        .select_from(table.join(link_table, link_column == table.c.id))
+        .where(link_table.c.event_id == event.c.id)
+        .scalar_subquery()
+    )
+
+
+async def load_events(db: AsyncSession, *criteria, page: Optional[PageParams] = None) -> Page[GettingEvent]:
+    """
+    Loads the events matching the criteria together with their criteria and benefits
+    in a single query, the rules are aggregated into JSON arrays per event row
+    """
+    result = await db.execute(apply_keyset(
+        select(
+            event.c.id,
+            event.c.title,
+            event.c.description,
+            event.c.is_active,
+            event.c.starts_at,
+            event.c.ends_at,
+            _rules_json(criterion, criterion_event, criterion_event.c.criterion_id,
+                        criterion.c.contrast, criterion.c.contrast_value, "contrast").label("criteria"),
+            _rules_json(benefit, benefit_event, benefit_event.c.benefit_id,
+                        benefit.c.action, benefit.c.action_value, "action").label("benefits")
+        ).where(*criteria),
+        [event.c.id], page
+    ))
+    rows, next_cursor = split_page(result.fetchall(), page, key=lambda row: (row.id,))
+
+    events = [
+        GettingEvent.model_construct(
+            id=row.id,
+            title=row.title,
+            description=row.description,
+            is_active=row.is_active,
+            starts_at=row.starts_at,
+            ends_at=row.ends_at,
+            criteria=[Criterion.model_construct(contrast=Contrast(rule["contrast"]), value=rule["value"])
+                      for rule in row.criteria],
+            benefits=[Benefit.model_construct(action=Activity(rule["action"]), value=rule["value"])
+                      for rule in row.benefits]
+        )
+        for row in rows
+    ]
+    return Page(items=events, next_cursor=next_cursor)
 
-        events = result.fetchall()
 
-        # Преобразуем результат в список объектов GettingEvent
-        active_events = [
-            GettingEvent(
-                id=row.id,
-                title=row.title,
-                description=row.description,
-                is_active=row.is_active
-            )
-            for row in events
-        ]
+async def get_active_events(db: AsyncSession, page: Optional[PageParams] = None) -> Page[GettingEvent]:
+    return await catalog_cache.get_or_load(
+        "events", cache_key(page.limit, page.after) if page else "all",
+        lambda: _load_active_events(db, page)
+    )
+
 
-        return active_events
+async def _load_active_events(db: AsyncSession, page: Optional[PageParams]) -> Page[GettingEvent]:
+    try:
+        return await load_events(db, event.c.is_active == True, page=page)
 
     except SQLAlchemyError as e:
         print(f"Database error while fetching active events: {e}")
@@ -144,24 +219,7 @@ async def get_active_events(db: AsyncSession) -> List[GettingEvent]:
 
 async def get_all_events(db: AsyncSession) -> List[GettingEvent]:
     try:
-        # SQL запрос для получения всех событий
-        stmt = select(event)
-        result = await db.execute(stmt)
-
-        events = result.fetchall()
-
-        # Преобразуем результат в список объектов GettingEvent
-        all_events = [
-            GettingEvent(
-                id=row.id,
-                title=row.title,
-                description=row.description,
-                is_active=row.is_active
-            )
-            for row in events
-        ]
-
-        return all_events
+        return (await load_events(db)).items
 
     except SQLAlchemyError as e:
         print(f"Database error while fetching all events: {e}")
@@ -170,121 +228,108 @@ async def get_all_events(db: AsyncSession) -> List[GettingEvent]:
 
 async def get_event_by_id(event_id: int, db: AsyncSession) -> GettingEvent:
     try:
-        # Fetch event details
-        stmt = select(event).where(event.c.id == event_id)
-        result = await db.execute(stmt)
-        row = result.fetchone()
-
-        if row is None:
+        events = (await load_events(db, event.c.id == event_id)).items
+        if not events:
             raise ValueError(f"Event with ID {event_id} not found.")
 
-        # Fetch related criteria for the event
-        criteria_stmt = select(criterion).join(criterion_event).where(criterion_event.c.event_id == event_id)
-        criteria_result = await db.execute(criteria_stmt)
-        criteria = [
-            GettingCriterion(
-                id=criterion_row.id,
-                contrast=criterion_row.contrast,
-                value=criterion_row.contrast_value
-            )
-            for criterion_row in criteria_result.fetchall()
-        ]
+        return events[0]
 
-        # Fetch related benefits for the event
-        benefits_stmt = select(benefit).join(benefit_event).where(benefit_event.c.event_id == event_id)
-        benefits_result = await db.execute(benefits_stmt)
-        benefits = [
-            GettingBenefit(
-                id=benefit_row.id,
-                action=benefit_row.action,
-                value=benefit_row.action_value
-            )
-            for benefit_row in benefits_result.fetchall()
-        ]
+    except SQLAlchemyError as e:
+        print(f"Database error while fetching event with ID {event_id}: {e}")
+        raise e
 
-        # Return the event with its criteria and benefits
-        get_event = GettingEvent(
-            id=row.id,
-            title=row.title,
-            description=row.description,
-            is_active=row.is_active,
-            criteria=criteria,
-            benefits=benefits
-        )
 
-        return get_event
+async def get_rule_set(db: AsyncSession) -> RuleSet:
+    """
+    Compiled rules of the active events, held in the worker's memory by compiled_rules
+    """
+    return await compiled_rules.get(lambda: _compile_rule_set(db))
+
+
+async def _compile_rule_set(db: AsyncSession) -> RuleSet:
+    try:
+        return RuleSet.compile((await load_events(db, event.c.is_active == True)).items)
 
     except SQLAlchemyError as e:
-        print(f"Database error while fetching event with ID {event_id}: {e}")
+        print(f"Database error while compiling promotion rules: {e}")
         raise e
 
 
+# deadlock_detected, serialization_failure
+RETRYABLE_SQLSTATES = {"40P01", "40001"}
+
+
+async def _lock_card_and_order(card_id: int, order_id: int, db: AsyncSession) -> Tuple[GettingCard, GettingOrder]:
+    """
+    Locks the card and then the order until the end of the transaction. Every redemption
+    takes the locks in this order, so concurrent tills queue up instead of overwriting
+    each other's points. An attempt that still fails with a deadlock or serialization
+    error is rolled back to its savepoint and repeated
+    """
+    for attempt in range(AKCE_LOCK_RETRIES):
+        try:
+            async with db.begin_nested():
+                card: GettingCard = await get_card_by_id(card_id, db, for_update=True)
+                if not card:
+                    raise ValueError("Can't use akce without bonus card")
+
+                order: GettingOrder = await get_order_by_id(order_id, db, for_update=True)
+                return card, order
+
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) not in RETRYABLE_SQLSTATES or attempt == AKCE_LOCK_RETRIES - 1:
+                raise e
+            print(f"Lock conflict on card {card_id} and order {order_id}, retrying: {e}")
+            await asyncio.sleep(0.01 * 2 ** attempt)
+
+
 async def use_akce(data: UseAkcesForm, db: AsyncSession) -> GettingOrder:
     try:
         print(f"Attempting to use 'akce' for card ID: {data.card_id} and order ID: {data.order_id}")
 
-        # Step 1: Get the bonus card by its ID
-        card: GettingCard = await get_card_by_id(data.card_id, db)
-        if not card:
-            raise ValueError("Can't use akce without bonus card")
-        print(f"Found card with ID {card.id}. Current card count: {card.count}, used points: {card.used_points}")
-
-        # Step 2: Get the order by its ID
-        order: GettingOrder = await get_order_by_id(data.order_id, db)
-        if not order:
-            raise ValueError("Can't use akce without order")
-        print(f"Found order with ID {order.id}. Total order cost: {order.cost}")
-
-        # Initialize updated values
-        updated_card_value = card.count
-        used_points = card.used_points
-        total_order_cost = order.cost
-
-        # Step 3: Loop through each 'akce' and apply criteria and benefits
-        for akce_id in data.akce_ids:
-            print(f"Processing 'akce' with ID: {akce_id}")
-
-            # Step 3.1: Get the 'akce' details from the database
-            akce: GettingEvent = await get_event_by_id(akce_id, db)
-            print(f"Found 'akce' with title: {akce.title}")
-
-            # Step 4: Apply criteria for the 'akce'
-            for criterion in akce.criteria:
-                comparison_func = contrast_operations.get(criterion.contrast)
-                if not comparison_func(order, card, criterion.value):
-                    raise ValueError(
-                        f"Card or order does not satisfy {criterion.contrast.value} {criterion.value} for akce {akce.title}"
-                    )
-                print(f"Criterion passed: {criterion.contrast.value} {criterion.value} for 'akce' {akce.title}")
-
-            # Step 5: Apply the benefits for the 'akce'
-            for benefit in akce.benefits:
-                print(f"Applying benefit with action: {benefit.action} and value: {benefit.value} for 'akce' {akce.title}")
-
-                apply_benefit = benefit_operations.get(benefit.action)
-                benefit_result = apply_benefit(order, card, benefit.value)
-
-                # Update the values after applying the benefit
-                updated_card_value = benefit_result.card_value
-                used_points = benefit_result.used_points
-                total_order_cost = benefit_result.total_cost
-
-                print(f"Benefit applied. Updated card value: {updated_card_value}, used points: {used_points}, total order cost: {total_order_cost}")
-
-        # Step 6: Update the card with the new values
-        await update_card_count(card.id, updated_card_value, used_points, db)
-        print(f"Card updated. New card value: {updated_card_value}, used points: {used_points}")
-
-        # Step 7: Update the order with the new total cost
-        await update_order_total_price(order.id, total_order_cost, db)
-        print(f"Order updated. New total cost: {total_order_cost}")
-
-        # Step 8: Return the updated order
-        updated_order = await get_order_by_id(data.order_id, db)
-        print(f"Returning updated order with ID: {updated_order.id}, total cost: {updated_order.cost}")
+        # Step 1: Lock the bonus card and the order, the values below can't change until commit
+        card, order = await _lock_card_and_order(data.card_id, data.order_id, db)
+
+        # Step 2: Evaluate the akce against the compiled rules, no rule queries on a warm cache
+        rules = await get_rule_set(db)
+        updated_order, updated_card = rules.redeem(data.akce_ids, order, card)
+
+        # Step 3: Update the card and the order with the new values
+        await update_card_count(card.id, updated_card.count, updated_card.used_points, db)
+        await update_order_total_price(order.id, updated_order.cost, db)
+        print(f"Akce applied. New card value: {updated_card.count}, used points: {updated_card.used_points}, "
+              f"total order cost: {updated_order.cost}")
 
         return updated_order
 
     except SQLAlchemyError as e:
         print(f"Database error while using 'akce' effect for card: {e}")
         raise e
+
+
+async def get_eligible_akce(order_id: int, card_id: int, db: AsyncSession) -> List[EligibleAkce]:
+    """
+    Active akce the order and card qualify for, with the result of applying each of them
+    """
+    try:
+        card: GettingCard = await get_card_by_id(card_id, db)
+        if not card:
+            raise ValueError(f"Card with ID {card_id} not found.")
+        order: GettingOrder = await get_order_by_id(order_id, db)
+
+        rules = await get_rule_set(db)
+        return [
+            EligibleAkce(
+                id=rule.event_id,
+                title=rule.title,
+                description=rule.description,
+                order_cost=preview_order.cost,
+                card_count=preview_card.count,
+                used_points=preview_card.used_points
+            )
+            for rule, preview_order, preview_card in rules.eligible(order, card)
+        ]
+
+    except SQLAlchemyError as e:
+        print(f"Database error while checking akce eligibility: {e}")
+        raise e
@@ -5,26 +5,6 @@ from src.order.schema import GettingOrder
 from src.card.schema import GettingCard
 
 
-contrast_operations = {
-    Contrast.greater_than: lambda order, card, criterion_value:
-        greater_for_count_points(order, card, criterion_value),
-    Contrast.greater_for_all: lambda order, card, criterion_value:
-        greater_for_all_points(order, card, criterion_value),
-    Contrast.count_items_in_order: lambda order, card, criterion_value:
-        check_items_count_in_order(order, card, criterion_value),
-    Contrast.define_item_in_order: lambda order, card, criterion_value:
-        check_define_item_in_order(order, card, criterion_value),
-}
-
-
-benefit_operations = {
-    Activity.add_cart_bonuses: lambda order, card, benefit_value: add_point_to_card(order, card, benefit_value),
-    Activity.reduce_card_bonuses: lambda order, card, benefit_value: reduce_bonuses_on_count(order, card, benefit_value),
-    Activity.reduce_order_sum: lambda order, card, benefit_value: reduce_sum_of_order_for_value(order, card, benefit_value),
-    Activity.reduce_order_sum_percent: lambda order, card, benefit_value: reduce_sum_of_order_for_percent(order, card, benefit_value)
-}
-
-
 class BenefitResult:
     card_value: int
     used_points: int
@@ -69,11 +49,11 @@ def reduce_sum_of_order_for_percent(order: GettingOrder, card: GettingCard, bene
 
 
 def greater_for_all_points(order: GettingOrder, card: GettingCard, criterion_value: float) -> bool:
-    return card.point + card.used_points > criterion_value
+    return card.count + card.used_points > criterion_value
 
 
 def greater_for_count_points(order: GettingOrder, card: GettingCard, criterion_value: float) -> bool:
-    return card.point > criterion_value
+    return card.count > criterion_value
 
 
 def check_items_count_in_order(order: GettingOrder, card: GettingCard, criterion_value: float) -> bool:
@@ -81,4 +61,21 @@ def check_items_count_in_order(order: GettingOrder, card: GettingCard, criterion
 
 
 def check_define_item_in_order(order: GettingOrder, card: GettingCard, criterion_value: float) -> bool:
-    return any(item.product_id == criterion_value for item in order.items)
+    return any(item.id == criterion_value for item in order.items)
+
+
+# Resolved once per rule when src.event.rules compiles the active events
+contrast_operations = {
+    Contrast.greater_than: greater_for_count_points,
+    Contrast.greater_for_all: greater_for_all_points,
+    Contrast.count_items_in_order: check_items_count_in_order,
+    Contrast.define_item_in_order: check_define_item_in_order,
+}
+
+
+benefit_operations = {
+    Activity.add_cart_bonuses: add_point_to_card,
+    Activity.reduce_card_bonuses: reduce_bonuses_on_count,
+    Activity.reduce_order_sum: reduce_sum_of_order_for_value,
+    Activity.reduce_order_sum_percent: reduce_sum_of_order_for_percent,
+}
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+
+from src.auth.models import User
+from src.database import get_pool_stats
+from src.dependencies import permission_dependency
+
+router = APIRouter(
+    prefix="/health",
+)
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats(user: User = Depends(permission_dependency("get_system_stats"))) -> dict:
+    return get_pool_stats()
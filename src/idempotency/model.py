@@ -0,0 +1,14 @@
+from sqlalchemy import Table, Column, Integer, String, TIMESTAMP, JSON
+
+from ..database import metadata
+
+idempotency_key = Table(
+    "idempotency_key",
+    metadata,
+    # sha256 of the endpoint, the caller and the Idempotency-Key header value
+    Column("key", String(64), primary_key=True),
+    Column("request_hash", String(64), nullable=False),
+    Column("status_code", Integer),
+    Column("response", JSON),
+    Column("expires_at", TIMESTAMP, nullable=False, index=True),
+)
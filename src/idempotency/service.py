@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import MISSING, MemoryCacheBackend
+from src.config import IDEMPOTENCY_TTL, IDEMPOTENCY_PURGE_INTERVAL, IDEMPOTENCY_CACHE_MAX_ENTRIES
+from src.database import on_commit, unit_of_work
+from src.idempotency.model import idempotency_key
+from src.responses import json_response_class
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Ответы уже выполненных запросов этого воркера, повтор не доходит до БД
+_recent_responses = MemoryCacheBackend(max_entries=IDEMPOTENCY_CACHE_MAX_ENTRIES)
+
+
+def _hash(*parts: Any) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _replay(request_hash: str, stored: tuple) -> Response:
+    stored_hash, status_code, body = stored
+    if stored_hash != request_hash:
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+
+    return json_response_class()(content=body, status_code=status_code, headers={REPLAYED_HEADER: "true"})
+
+
+async def _remember_response(stored_key: str, stored: tuple, expires_at: datetime) -> None:
+    # Кэш не должен пережить строку в таблице: после expires_at ключ можно занять заново
+    ttl = (expires_at - datetime.utcnow()).total_seconds()
+    if ttl > 0:
+        await _recent_responses.set("responses", stored_key, stored, ttl)
+
+
+async def run_idempotent(key: Optional[str], scope: str, payload: BaseModel, db: AsyncSession,
+                         handler: Callable[[], Awaitable[Any]], status_code: int = 200) -> Any:
+    """
+    Runs the handler once per Idempotency-Key. The key is claimed with an INSERT ... ON
+    CONFLICT in the request's own transaction, so a concurrent retry waits for the first
+    attempt and then replays its stored response, and a failed attempt releases the key
+    with its rollback. Without a key the handler simply runs
+    """
+    if not key:
+        return await handler()
+
+    try:
+        stored_key = _hash(scope, key)
+        request_hash = _hash(payload.model_dump_json())
+
+        cached = await _recent_responses.get("responses", stored_key)
+        if cached is not MISSING:
+            return _replay(request_hash, cached)
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=IDEMPOTENCY_TTL)
+        claim_stmt = insert(idempotency_key).values(
+            key=stored_key,
+            request_hash=request_hash,
+            expires_at=expires_at
+        )
+        # A key that expired but was not purged yet can be claimed again
+        claim_stmt = claim_stmt.on_conflict_do_update(
+            index_elements=[idempotency_key.c.key],
+            set_={
+                "request_hash": claim_stmt.excluded.request_hash,
+                "status_code": None,
+                "response": None,
+                "expires_at": claim_stmt.excluded.expires_at,
+            },
+            where=idempotency_key.c.expires_at < now
+        ).returning(idempotency_key.c.key)
+
+        claimed = (await db.execute(claim_stmt)).fetchone()
+        if not claimed:
+            stored_row = (await db.execute(
+                select(idempotency_key.c.request_hash, idempotency_key.c.status_code, idempotency_key.c.response,
+                       idempotency_key.c.expires_at)
+                .where(idempotency_key.c.key == stored_key)
+            )).fetchone()
+            if not stored_row:
+                raise HTTPException(status_code=409, detail=f"{IDEMPOTENCY_HEADER} is being released, retry the request")
+            stored = (stored_row.request_hash, stored_row.status_code, stored_row.response)
+            await _remember_response(stored_key, stored, stored_row.expires_at)
+            return _replay(request_hash, stored)
+
+        result = await handler()
+        body = result.model_dump(mode="json") if isinstance(result, BaseModel) else result
+
+        await db.execute(
+            idempotency_key.update()
+            .where(idempotency_key.c.key == stored_key)
+            .values(status_code=status_code, response=body)
+        )
+
+        async def _remember():
+            await _remember_response(stored_key, (request_hash, status_code, body), expires_at)
+
+        on_commit(db, _remember)
+        return json_response_class()(content=body, status_code=status_code)
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while handling idempotency key: {e}")
+        raise e
+
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    try:
+        result = await db.execute(delete(idempotency_key).where(idempotency_key.c.expires_at < datetime.utcnow()))
+        return result.rowcount
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while purging idempotency keys: {e}")
+        raise e
+
+
+async def purge_expired_keys_periodically() -> None:
+    """
+    Lifespan task evicting expired keys from the table
+    """
+    while True:
+        try:
+            async with unit_of_work() as db:
+                purged = await purge_expired_keys(db)
+            if purged:
+                print(f"Purged {purged} expired idempotency keys")
+        except Exception as e:
+            print(f"Idempotency key purge failed: {e}")
+        await asyncio.sleep(IDEMPOTENCY_PURGE_INTERVAL)
@@ -6,9 +6,9 @@ ingredient = Table(
     'ingredient',
     metadata,
     Column('id', BigInteger, primary_key=True, autoincrement=True),
-    Column('product_id', Integer, ForeignKey('product.id')),
+    Column('product_id', Integer, ForeignKey('product.id'), index=True),
     Column('value', Double, nullable=False),
-    Column('item_id', Integer, ForeignKey('item.id'), nullable=False),
+    Column('item_id', Integer, ForeignKey('item.id'), nullable=False, index=True),
     Column('value_type_id', Integer, ForeignKey('product_value_type.id')),
     Column("name", String),
 
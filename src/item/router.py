@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
@@ -8,6 +8,8 @@ from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
+from src.pagination import PageParams, page_params, set_next_cursor
+from src.responses import trusted_json
 from src.item.schema import ItemFields, GettingItem
 from src.item.service import create_item, get_all_active_items, update_item, delete_item, get_item_by_id
 
@@ -26,9 +28,12 @@ async def create_new_item(item: ItemFields, db: AsyncSession = Depends(get_db),
 
 
 @router.get("", response_model=List[GettingItem])
-async def get_items(db: AsyncSession = Depends(get_db)) -> List[GettingItem]:
+async def get_items(response: Response, page: PageParams = Depends(page_params),
+                    db: AsyncSession = Depends(get_db)) -> List[GettingItem]:
     try:
-        return await get_all_active_items(db)
+        items = await get_all_active_items(db, page)
+        set_next_cursor(response, items)
+        return trusted_json(items.items, response)
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
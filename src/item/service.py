@@ -3,13 +3,15 @@ from typing import Optional, List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy import select, update, delete, insert
+from sqlalchemy import select, update, delete, insert, func
 
 from src.comment.service import get_comments_for_item, delete_comment
 from src.item.model import item, ingredient
 from src.item.schema import ItemFields, AddingIngredient, GettingItem, GettingIngredientValueForItem, GettingIngredients
 from src.product.service import GettingProduct, get_product_by_id, get_or_create_value_type
 from src.product.model import product_value_type
+from src.pagination import Page, PageParams, apply_keyset, split_page
+from src.cache import catalog_cache, cache_key
 
 
 async def create_item(data: ItemFields, db: AsyncSession) -> GettingItem:
@@ -30,6 +32,7 @@ async def create_item(data: ItemFields, db: AsyncSession) -> GettingItem:
 
         # Executing the insert statement
         result = await db.execute(stmt)
+        catalog_cache.mark_stale(db, "items")
 
         # Extracting the returned row
         new_item_data = result.fetchone()
@@ -63,11 +66,9 @@ async def create_item(data: ItemFields, db: AsyncSession) -> GettingItem:
                     "cost": ingredient_cost if ingredient_cost else None
                 })
 
-        # If 'actualise_cost' is True, update the cost with the total cost of ingredients
+        # If 'actualise_cost' is True, store the cost of ingredients on the item
         if data.actualise_cost:
-            await db.execute(
-                item.update().where(item.c.id == item_id).values(cost=total_cost)
-            )
+            await refresh_item_costs(db, item.c.id == item_id)
 
         # Return the newly created item data along with the ingredients
         return GettingItem(
@@ -87,92 +88,101 @@ async def create_item(data: ItemFields, db: AsyncSession) -> GettingItem:
         raise e
 
 
-async def get_ingredients_for_item(item_id: int, db: AsyncSession) -> List[GettingIngredients]:
-    try:
-        # Получаем product_id, value, name и value_type из таблицы ingredient, если они есть
-        ingredient_stmt = (
-            select(
-                ingredient.c.product_id,
-                ingredient.c.value,
-                ingredient.c.name,
-                ingredient.c.value_type_id,
-                product.c.name.label("product_name"),
-                product_value_type.c.name.label("product_value_type"),
-                product.c.cost_per_one.label("product_cost")
-            )
-            .join(product, ingredient.c.product_id == product.c.id, isouter=True)
-            .join(product_value_type, product.c.value_type_id == product_value_type.c.id, isouter=True)
-            .where(ingredient.c.item_id == item_id)
+def _ingredients_query():
+    return (
+        select(
+            ingredient.c.item_id,
+            ingredient.c.product_id,
+            ingredient.c.value,
+            ingredient.c.name,
+            ingredient.c.value_type_id,
+            product.c.name.label("product_name"),
+            product_value_type.c.name.label("product_value_type"),
+            product.c.cost_per_one.label("product_cost")
         )
+        .join(product, ingredient.c.product_id == product.c.id, isouter=True)
+        .join(product_value_type, product.c.value_type_id == product_value_type.c.id, isouter=True)
+        .order_by(ingredient.c.id)
+    )
 
-        ingredient_result = await db.execute(ingredient_stmt)
-        ingredient_rows = ingredient_result.fetchall()
-
-        # Формируем список ингредиентов
-        ingredients_list = []
-        for row in ingredient_rows:
-            # Если данные есть в ingredient, используем их, иначе fallback на product или дефолтные значения
-            ingredients_list.append(
-                GettingIngredients(
-                    product_id=row.product_id,
-                    name=row.name if row.name else (row.product_name or ''),  # Имя из ingredient или product
-                    value=row.value,  # Обязательно берем значение из ingredient
-                    value_type=row.product_value_type if row.value_type_id is None else row.value_type_id,  # value_type из ingredient или product
-                    cost=row.product_cost if row.product_cost is not None else 0.0  # Цена из product или дефолт
-                )
-            )
 
-        return ingredients_list
+def _ingredient_from_row(row) -> GettingIngredients:
+    # Строки из БД уже соответствуют схеме, поэтому модель собирается без повторной валидации
+    # Если данные есть в ingredient, используем их, иначе fallback на product или дефолтные значения
+    return GettingIngredients.model_construct(
+        product_id=row.product_id,
+        name=row.name if row.name else (row.product_name or ''),  # Имя из ingredient или product
+        value=row.value,  # Обязательно берем значение из ingredient
+        value_type=row.product_value_type if row.value_type_id is None else row.value_type_id,  # value_type из ingredient или product
+        cost=row.product_cost if row.product_cost is not None else 0.0  # Цена из product или дефолт
+    )
+
+
+async def get_ingredients_for_item(item_id: int, db: AsyncSession) -> List[GettingIngredients]:
+    try:
+        ingredient_result = await db.execute(_ingredients_query().where(ingredient.c.item_id == item_id))
+
+        return [_ingredient_from_row(row) for row in ingredient_result.fetchall()]
 
     except SQLAlchemyError as e:
         print(f"Error occurred while fetching ingredients for item {item_id}: {e}")
         raise e
 
 
-async def get_all_active_items(db: AsyncSession) -> Optional[List[GettingItem]]:
-    try:
-        result = await db.execute(
-            select(
-                item.c.id,
-                item.c.title,
-                item.c.description,
-                item.c.actualise_cost,
-                item.c.is_active,
-                item.c.cost
-            ).where(item.c.is_active == True)
+async def load_items(db: AsyncSession, *criteria, page: Optional[PageParams] = None) -> Page[GettingItem]:
+    """
+    Loads the items matching the criteria with their ingredients, products and value
+    types in two queries and assembles them in memory. Nothing is written: the cost
+    of actualise_cost items is kept up to date by refresh_item_costs.
+    """
+    item_result = await db.execute(apply_keyset(
+        select(
+            item.c.id,
+            item.c.title,
+            item.c.description,
+            item.c.actualise_cost,
+            item.c.is_active,
+            item.c.cost
+        ).where(*criteria),
+        [item.c.id], page
+    ))
+    item_rows, next_cursor = split_page(item_result.fetchall(), page, key=lambda row: (row.id,))
+    if not item_rows:
+        return Page(items=[])
+
+    ingredient_result = await db.execute(
+        _ingredients_query().where(ingredient.c.item_id.in_([row.id for row in item_rows]))
+    )
+
+    ingredient_rows_by_item = {}
+    for ingredient_row in ingredient_result.fetchall():
+        ingredient_rows_by_item.setdefault(ingredient_row.item_id, []).append(ingredient_row)
+
+    items = []
+    for row in item_rows:
+        ingredient_rows = ingredient_rows_by_item.get(row.id, [])
+
+        items.append(
+            GettingItem.model_construct(
+                id=row.id,
+                title=row.title,
+                description=row.description,
+                ingredients=[_ingredient_from_row(ing) for ing in ingredient_rows],
+                cost=row.cost,
+                actualise_cost=row.actualise_cost,
+                is_active=row.is_active
+            )
         )
 
-        rows = result.fetchall()
-        if not rows:
-            return None
-
-        active_items = []
+    return Page(items=items, next_cursor=next_cursor)
 
-        for row in rows:
-            if row.actualise_cost:
-                total_cost = await calculate_total_cost(row.id, db)
-                await db.execute(
-                    update(item).where(item.c.id == row.id).values(cost=total_cost)
-                )
-                await db.commit()
-            else:
-                total_cost = row.cost
-
-            ingredients_list = await get_ingredients_for_item(row.id, db)
-
-            active_items.append(
-                GettingItem(
-                    id=row.id,
-                    title=row.title,
-                    description=row.description,
-                    ingredients=ingredients_list,
-                    cost=total_cost,
-                    actualise_cost=row.actualise_cost,
-                    is_active=row.is_active
-                )
-            )
 
-        return active_items
+async def get_all_active_items(db: AsyncSession, page: Optional[PageParams] = None) -> Page[GettingItem]:
+    try:
+        return await catalog_cache.get_or_load(
+            "items", cache_key(page.limit, page.after) if page else "all",
+            lambda: load_items(db, item.c.is_active == True, page=page)
+        )
 
     except SQLAlchemyError as e:
         print(f"Error occurred while fetching active items: {e}")
@@ -204,7 +214,7 @@ async def add_ingredient(ing: AddingIngredient, item_id: int, db: AsyncSession):
         )
 
         await db.execute(new_ingredient)
-        await db.commit()
+        catalog_cache.mark_stale(db, "items")
     except SQLAlchemyError as e:
         await db.rollback()
         print(f"Error occurred while adding ingredient: {e}")
@@ -227,7 +237,7 @@ async def update_ingredient(ingredient_id: int, ing: AddingIngredient, db: Async
             )
         )
         await db.execute(update_stmt)
-        await db.commit()
+        catalog_cache.mark_stale(db, "items")
     except SQLAlchemyError as e:
         await db.rollback()
         print(f"Error occurred while updating ingredient: {e}")
@@ -238,6 +248,7 @@ async def delete_ingredient(ingredient_id: int, db: AsyncSession):
     try:
         delete_stmt = delete(ingredient).where(ingredient.c.id == ingredient_id)
         await db.execute(delete_stmt)
+        catalog_cache.mark_stale(db, "items")
     except SQLAlchemyError as e:
         await db.rollback()
         print(f"Error occurred while deleting ingredient: {e}")
@@ -275,7 +286,7 @@ async def set_activation_state(item_id: int, state: bool, db: AsyncSession) -> O
         )
 
         await db.execute(update_stmt)
-        await db.commit()
+        catalog_cache.mark_stale(db, "items")
 
         return item_id
     except SQLAlchemyError as e:
@@ -284,64 +295,46 @@ async def set_activation_state(item_id: int, state: bool, db: AsyncSession) -> O
         raise e
 
 
-async def change_items_state_for_product(product_id: int, exist_product_value: float, db: AsyncSession):
+async def refresh_item_availability(product_ids, db: AsyncSession) -> None:
+    """
+    Re-evaluates in one UPDATE whether the items using any of the products can still be
+    made: an item stays active only while every product of its recipe has enough stock
+    """
     try:
-        items_with_product = await get_item_ids_by_product(product_id, db)
-
-        if not items_with_product:
-            print(f"No items found for product_id: {product_id}")
+        product_ids = list(product_ids)
+        if not product_ids:
             return
 
-        for item in items_with_product:
-
-            new_state = exist_product_value >= item.value
-            await set_activation_state(item.item_id, new_state, db)
+        short_ingredient = (
+            select(ingredient.c.id)
+            .join(product, ingredient.c.product_id == product.c.id)
+            .where(ingredient.c.item_id == item.c.id, product.c.value < ingredient.c.value)
+            .exists()
+        )
 
-        await db.commit()
+        # Only the items whose availability actually flips are written and locked
+        result = await db.execute(
+            update(item)
+            .where(item.c.id.in_(select(ingredient.c.item_id).where(ingredient.c.product_id.in_(product_ids))),
+                   item.c.is_active.is_distinct_from(~short_ingredient))
+            .values(is_active=~short_ingredient)
+        )
+        if result.rowcount > 0:
+            catalog_cache.mark_stale(db, "items")
 
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Error occurred while changing item states for product_id {product_id}: {e}")
+        print(f"Error occurred while refreshing item availability for products {product_ids}: {e}")
         raise e
 
 
 async def get_item_by_id(item_id: int, db: AsyncSession) -> GettingItem:
     try:
-        result = await db.execute(
-            select(
-                item.c.id,
-                item.c.title,
-                item.c.description,
-                item.c.is_active,
-                item.c.actualise_cost,
-                item.c.cost
-            ).where(item.c.id == item_id)
-        )
-
-        row = result.fetchone()
-        if row is None:
+        items = (await load_items(db, item.c.id == item_id)).items
+        if not items:
             raise ValueError(f"Item with ID {item_id} not found.")
 
-        if row.actualise_cost:
-            total_cost = await calculate_total_cost(item_id, db)
-            await db.execute(
-                update(item).where(item.c.id == item_id).values(cost=total_cost)
-            )
-            await db.commit()
-        else:
-            total_cost = row.cost
-
-        ingredients_list = await get_ingredients_for_item(item_id, db)
-
-        return GettingItem(
-            id=row.id,
-            title=row.title,
-            description=row.description,
-            ingredients=ingredients_list if len(ingredients_list) > 0 else [],
-            cost=total_cost,
-            actualise_cost=row.actualise_cost,
-            is_active=row.is_active
-        )
+        return items[0]
 
     except SQLAlchemyError as e:
         print(f"Error occurred while fetching item by ID: {e}")
@@ -362,6 +355,7 @@ async def update_item(item_id: int, data: ItemFields, db: AsyncSession) -> Getti
             )
         )
         await db.execute(update_stmt)
+        catalog_cache.mark_stale(db, "items")
 
         for ing in data.ingredients:
             if ing.product_id in existing_ingredient_ids:
@@ -373,7 +367,8 @@ async def update_item(item_id: int, data: ItemFields, db: AsyncSession) -> Getti
             if existing_ing.product_id not in {ing.product_id for ing in data.ingredients}:
                 await delete_ingredient(existing_ing.product_id, db)
 
-        await db.commit()
+        await refresh_item_costs(db, item.c.id == item_id)
+
         return await get_item_by_id(item_id, db)
 
     except SQLAlchemyError as e:
@@ -394,13 +389,13 @@ async def delete_item(item_id: int, db: AsyncSession) -> None:
 
         # Retrieve and delete all comments associated with the item
         comments = await get_comments_for_item(item_id, db)
-        for comment in comments:
+        for comment in comments.items:
             await delete_comment(comment.id, db)
 
         # Delete the item itself
         delete_stmt = delete(item).where(item.c.id == item_id)
         await db.execute(delete_stmt)
-        await db.commit()
+        catalog_cache.mark_stale(db, "items")
 
     except SQLAlchemyError as e:
         await db.rollback()
@@ -408,29 +403,33 @@ async def delete_item(item_id: int, db: AsyncSession) -> None:
         raise e
 
 
-async def calculate_total_cost(item_id: int, db: AsyncSession) -> float:
+async def refresh_item_costs(db: AsyncSession, *criteria) -> None:
+    """
+    Recomputes the stored cost of the actualise_cost items matching the criteria
+    from their ingredients in a single UPDATE
+    """
     try:
-        ingredient_stmt = (
-            select(
-                ingredient.c.product_id,
-                ingredient.c.value,
-                product.c.cost_per_one.label('product_cost')
-            )
-            .join(product, ingredient.c.product_id == product.c.id, isouter=True)
-            .where(ingredient.c.item_id == item_id)
+        ingredients_cost = (
+            select(func.coalesce(func.sum(ingredient.c.value * func.coalesce(product.c.cost_per_one, 0.0)), 0.0))
+            .select_from(ingredient.outerjoin(product, ingredient.c.product_id == product.c.id))
+            .where(ingredient.c.item_id == item.c.id)
+            .scalar_subquery()
         )
 
-        ingredient_result = await db.execute(ingredient_stmt)
-        ingredients = ingredient_result.fetchall()
-
-        # Вычисляем общую стоимость
-        total_cost = sum(
-            row.value * (row.product_cost or 0.0)  # Если стоимость не указана, берем 0
-            for row in ingredients
+        await db.execute(
+            update(item)
+            .where(item.c.actualise_cost == True, *criteria)
+            .values(cost=ingredients_cost)
         )
-
-        return total_cost
+        catalog_cache.mark_stale(db, "items")
 
     except SQLAlchemyError as e:
-        print(f"Error occurred while calculating total cost for item {item_id}: {e}")
+        await db.rollback()
+        print(f"Error occurred while refreshing item costs: {e}")
         raise e
+
+
+async def refresh_item_costs_for_product(product_id: int, db: AsyncSession) -> None:
+    await refresh_item_costs(
+        db, item.c.id.in_(select(ingredient.c.item_id).where(ingredient.c.product_id == product_id))
+    )
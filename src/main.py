@@ -1,5 +1,8 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from starlette.middleware.cors import CORSMiddleware
 from auth.base_config import auth_backend, fastapi_users
 from auth.schemas import UserCreate, UserRead, UserUpdate
@@ -14,6 +17,17 @@ from event import router as EventRouter
 from auth import router as RoleRouter
 from src.profile import router as ProfileRouter
 from src.order import router as OrderRouter
+from src.health import router as HealthRouter
+from src.report import router as ReportRouter
+from src.database import dispose_engine
+from src.idempotency.service import IDEMPOTENCY_HEADER, REPLAYED_HEADER, purge_expired_keys_periodically
+from src.order.group_commit import order_group_committer
+from src.order.partitions import maintain_order_partitions_periodically
+from src.report.service import refresh_sales_rollups_periodically
+from src.event.scheduler import schedule_event_activation_periodically
+from src.config import ORDER_GROUP_COMMIT
+from src.pagination import NEXT_CURSOR_HEADER
+from src.responses import default_response_class, remember_response_class
 from src.middleware import (
     db_integrity_error_middleware,
     validation_exception_handler,
@@ -22,8 +36,30 @@ from src.middleware import (
 )
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background_tasks = [
+        asyncio.create_task(purge_expired_keys_periodically()),
+        asyncio.create_task(maintain_order_partitions_periodically()),
+        asyncio.create_task(refresh_sales_rollups_periodically()),
+        asyncio.create_task(schedule_event_activation_periodically()),
+    ]
+    if ORDER_GROUP_COMMIT:
+        order_group_committer.start()
+    yield
+    await order_group_committer.stop()
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await dispose_engine()
+
+
 app = FastAPI(
     title="Product API",
+    lifespan=lifespan,
+    default_response_class=default_response_class,
+    dependencies=[Depends(remember_response_class)],
 )
 
 
@@ -63,6 +99,8 @@ app.include_router(EventRouter.router, prefix='/api/v1', tags=["Akce"])
 app.include_router(ProfileRouter.router, prefix='/api/v1', tags=["Profile Management"])
 app.include_router(OrderRouter.router, prefix='/api/v1', tags=["Order"])
 app.include_router(RoleRouter.router, prefix='/api/v1', tags=["Role"])
+app.include_router(HealthRouter.router, prefix='/api/v1', tags=["Health"])
+app.include_router(ReportRouter.router, prefix='/api/v1', tags=["Report"])
 
 origins = [
     "http://localhost:3000",
@@ -74,7 +112,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PATCH", "PUT"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", "Access-Control-Allow-Origin",
-                   "Authorization"],
+                   "Authorization", IDEMPOTENCY_HEADER],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER],
 )
 
 if __name__ == '__main__':
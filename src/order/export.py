@@ -0,0 +1,80 @@
+import csv
+import io
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+import orjson
+from sqlalchemy import select
+
+from src.database import engine
+from src.order.model import order, order_item
+
+EXPORT_COLUMNS = ["order_id", "date", "user_id", "order_cost", "item_id", "title", "count", "unit_price",
+                  "line_total"]
+EXPORT_CHUNK_ROWS = 1000
+
+
+def _export_query(user_id: Optional[UUID], date_from: Optional[date], date_to: Optional[date],
+                  item_id: Optional[int]):
+    stmt = (
+        select(
+            order.c.id.label("order_id"),
+            order.c.date,
+            order.c.user_id,
+            order.c.cost.label("order_cost"),
+            order_item.c.item_id,
+            order_item.c.title,
+            order_item.c.count,
+            order_item.c.unit_price,
+            (order_item.c.count * order_item.c.unit_price).label("line_total")
+        )
+        .select_from(order.join(order_item, order_item.c.order_id == order.c.id))
+        .order_by(order.c.date, order.c.id, order_item.c.id)
+    )
+
+    # Bounds on the partition key, only the partitions of the range are scanned
+    if date_from is not None:
+        stmt = stmt.where(order.c.date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        stmt = stmt.where(order.c.date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if user_id is not None:
+        stmt = stmt.where(order.c.user_id == user_id)
+    if item_id is not None:
+        stmt = stmt.where(order_item.c.item_id == item_id)
+    return stmt
+
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+
+
+def _csv_chunk(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        ["" if value is None else value.isoformat() if isinstance(value, (date, datetime)) else value
+         for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def stream_order_ledger(export_format: str, user_id: Optional[UUID] = None, date_from: Optional[date] = None,
+                              date_to: Optional[date] = None, item_id: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Yields the order lines matching the filters as NDJSON or CSV chunks. The rows come
+    from a server-side cursor on a connection of its own, since the body is streamed
+    after the request's session has been closed, so memory stays flat whatever the range
+    """
+    if export_format == "csv":
+        yield _csv_chunk([], header=True)
+
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            _export_query(user_id, date_from, date_to, item_id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+        )
+        async for rows in result.partitions(EXPORT_CHUNK_ROWS):
+            yield _csv_chunk(rows) if export_format == "csv" else _ndjson_chunk(rows)
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+from src.config import ORDER_GROUP_COMMIT, ORDER_GROUP_COMMIT_MAX_BATCH, ORDER_GROUP_COMMIT_MAX_DELAY_MS
+from src.database import unit_of_work
+from src.order.schema import CreatingOrder, GettingOrder
+from src.order.service import create_order, create_orders
+
+
+class OrderGroupCommitter:
+    """
+    Collects orders submitted by concurrent requests of this worker and writes them in
+    one transaction, flushing every max_delay_ms or as soon as max_batch orders are
+    waiting. When the shared transaction fails, e.g. one order hits a stock shortage,
+    the batch is retried order by order so every caller gets its own result.
+    """
+
+    def __init__(self, max_batch: int = ORDER_GROUP_COMMIT_MAX_BATCH,
+                 max_delay_ms: float = ORDER_GROUP_COMMIT_MAX_DELAY_MS, session_maker=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.session_maker = session_maker
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        # Ограниченная очередь: при перегрузке запросы ждут, а не копятся в памяти
+        self._queue = asyncio.Queue(maxsize=self.max_batch * 10)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+
+        # Pending orders are flushed before the worker exits
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, order_data: CreatingOrder) -> GettingOrder:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((order_data, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[CreatingOrder, asyncio.Future]]) -> None:
+        try:
+            async with unit_of_work(self.session_maker) as db:
+                created_orders = await create_orders([order_data for order_data, _ in batch], db)
+        except Exception as e:
+            # unit_of_work swallows on_commit errors, so reaching here means nothing was committed
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+
+            print(f"Group commit of {len(batch)} orders failed, retrying one by one: {e}")
+            for order_data, future in batch:
+                try:
+                    async with unit_of_work(self.session_maker) as db:
+                        created_order = await create_order(order_data, db)
+                except Exception as order_error:
+                    if not future.done():
+                        future.set_exception(order_error)
+                else:
+                    if not future.done():
+                        future.set_result(created_order)
+            return
+
+        for (_, future), created_order in zip(batch, created_orders):
+            if not future.done():
+                future.set_result(created_order)
+
+
+order_group_committer = OrderGroupCommitter()
+
+
+def group_commit_enabled() -> bool:
+    return ORDER_GROUP_COMMIT and order_group_committer.running
@@ -1,5 +1,5 @@
 from sqlalchemy import MetaData, Table, Column, Integer, String, TIMESTAMP, ForeignKey, JSON, BigInteger, Double, \
-    Boolean, UUID
+    Boolean, UUID, Index, DDL, event
 
 from ..auth.models import User
 from ..database import metadata
@@ -7,11 +7,21 @@ from ..database import metadata
 order = Table(
     'order',
     metadata,
-    Column('id', BigInteger, primary_key=True),
+    Column('id', BigInteger, primary_key=True, autoincrement=True),
     Column('user_id', UUID, ForeignKey(User.id)),
     Column('cost', Double, nullable=False),
-    Column('date', TIMESTAMP, nullable=False),
-    Column('comment', String(255))
+    # Таблица секционирована по месяцам, ключ секции входит в первичный ключ
+    Column('date', TIMESTAMP, primary_key=True),
+    Column('comment', String(255)),
+    Index('ix_order_user_id_date', 'user_id', 'date'),
+    postgresql_partition_by='RANGE (date)',
+)
+
+# Monthly partitions are managed by src.order.partitions, rows outside them land here
+event.listen(
+    order,
+    "after_create",
+    DDL('CREATE TABLE IF NOT EXISTS order_default PARTITION OF "order" DEFAULT').execute_if(dialect="postgresql")
 )
 
 order_item = Table(
@@ -19,8 +29,17 @@ order_item = Table(
     metadata,
     Column('id', BigInteger, primary_key=True),
     Column('item_id', BigInteger, ForeignKey('item.id'), nullable=False),
-    Column('order_id', BigInteger, ForeignKey('order.id'), nullable=False),
+    # No foreign key: order.id is unique only together with the partition key, and a
+    # referenced partition could not be detached. detach_order_partition archives the
+    # lines of a detached month itself
+    Column('order_id', BigInteger, nullable=False),
     Column('count', Double, nullable=False),
+    # Снимок позиции на момент покупки, история заказов не зависит от текущего меню
+    Column('unit_price', Double, nullable=False),
+    Column('title', String, nullable=False),
+    Column('description', String),
+    Column('ingredients', JSON, nullable=False),
+    Index('ix_order_item_order_id', 'order_id'),
 )
 
 order_item_ingredient = Table(
@@ -30,4 +49,5 @@ order_item_ingredient = Table(
     Column('product_id', Integer, ForeignKey('product.id'), nullable=False),
     Column('value', Double, nullable=False),
     Column('order_item_id', Integer, ForeignKey('order_item.id'), nullable=False),
+    Index('ix_order_item_ingredient_order_item_id', 'order_item_id'),
 )
\ No newline at end of file
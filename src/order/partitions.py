@@ -0,0 +1,161 @@
+import asyncio
+import sys
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import ORDER_PARTITION_MONTHS_AHEAD, ORDER_PARTITION_CHECK_INTERVAL
+from src.database import unit_of_work
+
+DEFAULT_PARTITION = "order_default"
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"order_y{month.year}m{month.month:02d}"
+
+
+async def _partition_exists(name: str, db: AsyncSession) -> bool:
+    result = await db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return result.scalar()
+
+
+async def create_order_partition(month: date, db: AsyncSession) -> bool:
+    """
+    Creates the partition of the month unless it exists. Orders of that month that
+    already fell into the default partition are moved into it before attaching
+    """
+    month = month_start(month)
+    name = partition_name(month)
+
+    try:
+        if await _partition_exists(name, db):
+            return False
+
+        bounds = {"low": month, "high": next_month(month)}
+        await db.execute(text(f'CREATE TABLE {name} (LIKE "order" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        await db.execute(text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :low AND date < :high RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ), bounds)
+        await db.execute(text(
+            f"ALTER TABLE \"order\" ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['low'].isoformat()}') TO ('{bounds['high'].isoformat()}')"
+        ))
+        return True
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while creating order partition {name}: {e}")
+        raise e
+
+
+async def ensure_order_partitions(db: AsyncSession, months_ahead: int = ORDER_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Makes sure the current month and the next months_ahead months have partitions
+    """
+    # Every worker runs this at startup, only one of them creates the tables
+    await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('order_partitions'))"))
+
+    created = []
+    month = month_start(datetime.utcnow().date())
+    for _ in range(months_ahead + 1):
+        if await create_order_partition(month, db):
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def line_archive_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+async def _archive_order_lines(name: str, month: date, db: AsyncSession) -> None:
+    """
+    Moves the order_item and order_item_ingredient rows of the orders in the detached
+    partition name into archive tables of the month, next to the partition
+    """
+    item_archive = line_archive_name("order_item", month)
+    ingredient_archive = line_archive_name("order_item_ingredient", month)
+
+    await db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {item_archive} (LIKE order_item INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    await db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {ingredient_archive} '
+        f'(LIKE order_item_ingredient INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    # Ингредиенты первыми: они ссылаются на строки order_item
+    await db.execute(text(
+        f'WITH moved AS (DELETE FROM order_item_ingredient WHERE order_item_id IN '
+        f'(SELECT order_item.id FROM order_item JOIN {name} ON order_item.order_id = {name}.id) RETURNING *) '
+        f'INSERT INTO {ingredient_archive} SELECT * FROM moved'
+    ))
+    await db.execute(text(
+        f'WITH moved AS (DELETE FROM order_item WHERE order_id IN (SELECT id FROM {name}) RETURNING *) '
+        f'INSERT INTO {item_archive} SELECT * FROM moved'
+    ))
+
+
+async def detach_order_partition(month: date, db: AsyncSession) -> str:
+    """
+    Detaches the partition of the month from "order" and moves the lines of its orders
+    out of order_item and order_item_ingredient into archive tables of the month. The
+    three tables stay in the database, ready to be dumped or moved to a cold
+    tablespace and dropped together
+    """
+    month = month_start(month)
+    name = partition_name(month)
+
+    try:
+        if not await _partition_exists(name, db):
+            raise ValueError(f"Order partition {name} does not exist.")
+
+        await db.execute(text(f'ALTER TABLE "order" DETACH PARTITION {name}'))
+        await _archive_order_lines(name, month, db)
+        return name
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while detaching order partition {name}: {e}")
+        raise e
+
+
+async def maintain_order_partitions_periodically() -> None:
+    """
+    Lifespan task creating the upcoming monthly partitions ahead of time
+    """
+    while True:
+        try:
+            async with unit_of_work() as db:
+                created = await ensure_order_partitions(db)
+            if created:
+                print(f"Created order partitions: {', '.join(created)}")
+        except Exception as e:
+            print(f"Order partition maintenance failed: {e}")
+        await asyncio.sleep(ORDER_PARTITION_CHECK_INTERVAL)
+
+
+async def _detach(month: str) -> None:
+    async with unit_of_work() as db:
+        month_day = date.fromisoformat(f"{month}-01")
+        name = await detach_order_partition(month_day, db)
+    print(f"Detached {name}, lines archived to {line_archive_name('order_item', month_day)} "
+          f"and {line_archive_name('order_item_ingredient', month_day)}")
+
+
+if __name__ == '__main__':
+    # python -m src.order.partitions detach 2024-01
+    if len(sys.argv) != 3 or sys.argv[1] != "detach":
+        sys.exit("usage: python -m src.order.partitions detach YYYY-MM")
+    asyncio.run(_detach(sys.argv[2]))
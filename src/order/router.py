@@ -1,15 +1,23 @@
-from typing import List
+from datetime import date
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
-from src.order.schema import GettingOrder, CreatingOrder
-from src.order.service import create_order, get_order_by_id, get_user_orders
+from src.pagination import PageParams, page_params, set_next_cursor
+from src.responses import trusted_json
+from src.idempotency.service import IDEMPOTENCY_HEADER, run_idempotent
+from src.order.group_commit import group_commit_enabled, order_group_committer
+from src.order.export import stream_order_ledger
+from src.order.schema import GettingOrder, CreatingOrder, CreatingOrderBatch, OrderBatchResult
+from src.order.service import create_order, create_orders_batch, get_order_by_id, get_user_orders
+from src.product.service import InsufficientStockError
 
 from src.event.schema import UseAkcesForm
 from src.event.service import use_akce
@@ -21,42 +29,87 @@ router = APIRouter(
 
 @router.post("", response_model=GettingOrder, status_code=status.HTTP_201_CREATED)
 async def create_new_order(order: CreatingOrder, db: AsyncSession = Depends(get_db),
-                           user: User = Depends(permission_dependency())) -> GettingOrder:
+                           user: User = Depends(permission_dependency()),
+                           idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)) -> GettingOrder:
     if order.user_id is None:
         order.user_id = user.id
-    created_order = await create_order(order, db)
-    if not created_order:
-        raise HTTPException(status_code=400, detail="Failed to create order")
-    return created_order
+
+    async def _create() -> GettingOrder:
+        # A keyed request keeps its own transaction, so its key is committed with the order
+        try:
+            if not idempotency_key and group_commit_enabled():
+                created_order = await order_group_committer.submit(order)
+            else:
+                created_order = await create_order(order, db)
+        except InsufficientStockError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"message": str(e), "products": e.shortages})
+        if not created_order:
+            raise HTTPException(status_code=400, detail="Failed to create order")
+        return created_order
+
+    return await run_idempotent(idempotency_key, f"POST /order:{user.id}", order, db, _create,
+                                status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/batch", response_model=List[OrderBatchResult])
+async def create_order_batch(batch: CreatingOrderBatch, db: AsyncSession = Depends(get_db),
+                             user: User = Depends(permission_dependency("order_batch"))) -> List[OrderBatchResult]:
+    # Replay of orders collected offline by the tills, written in one transaction
+    for order in batch.orders:
+        if order.user_id is None:
+            order.user_id = user.id
+    results = await create_orders_batch(batch.orders, db)
+    return trusted_json(results)
 
 
 @router.get("", response_model=List[GettingOrder])
-async def get_my_all_orders(db: AsyncSession = Depends(get_db),
-                              user: User = Depends(permission_dependency())) -> List[GettingOrder]:
+async def get_my_all_orders(response: Response, page: PageParams = Depends(page_params),
+                            db: AsyncSession = Depends(get_db),
+                            user: User = Depends(permission_dependency())) -> List[GettingOrder]:
     try:
-        orders = await get_user_orders(user.id, db)
-        if not orders:
+        orders = await get_user_orders(user.id, db, page)
+        # Only the first page is a 404; a cursor may lead to an empty last page
+        if not orders.items and page.after is None:
             raise HTTPException(status_code=404, detail="No orders found for this user")
-        return orders
+        set_next_cursor(response, orders)
+        return trusted_json(orders.items, response)
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 
+@router.get("/export", response_class=StreamingResponse)
+async def export_orders(export_format: Literal["ndjson", "csv"] = "ndjson", user_id: Optional[UUID] = None,
+                        date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        item_id: Optional[int] = None,
+                        user: User = Depends(permission_dependency("export_orders"))) -> StreamingResponse:
+    # Declared before /{user_id} so "export" is not taken for a user id
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_order_ledger(export_format, user_id, date_from, date_to, item_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{export_format}"'}
+    )
+
+
 @router.get("/{user_id}", response_model=List[GettingOrder])
-async def get_user_all_orders(user_id: UUID, db: AsyncSession = Depends(get_db)) -> List[GettingOrder]:
+async def get_user_all_orders(user_id: UUID, response: Response, page: PageParams = Depends(page_params),
+                              db: AsyncSession = Depends(get_db)) -> List[GettingOrder]:
     try:
-        orders = await get_user_orders(user_id, db)
-        if not orders:
+        orders = await get_user_orders(user_id, db, page)
+        # Only the first page is a 404; a cursor may lead to an empty last page
+        if not orders.items and page.after is None:
             raise HTTPException(status_code=404, detail="No orders found for this user")
-        return orders
+        set_next_cursor(response, orders)
+        return trusted_json(orders.items, response)
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 
 @router.get("/{order_id}/detail", response_model=GettingOrder)
-async def get_order(order_id: int, db: AsyncSession = Depends(get_db)) -> GettingOrder:
+async def get_order(order_id: int, order_date: Optional[date] = None,
+                    db: AsyncSession = Depends(get_db)) -> GettingOrder:
     try:
-        order = await get_order_by_id(order_id, db)
+        order = await get_order_by_id(order_id, db, order_date)
         if not order:
             raise HTTPException(status_code=404, detail=f"Order with ID {order_id} not found")
         return order
@@ -65,8 +118,13 @@ async def get_order(order_id: int, db: AsyncSession = Depends(get_db)) -> Gettin
 
 
 @router.put("", response_model=GettingOrder)
-async def use_akces_for_order(data: UseAkcesForm, db: AsyncSession = Depends(get_db)) -> GettingOrder:
-    akce_order = await use_akce(data, db)
-    if not akce_order:
-        raise HTTPException(status_code=400, detail="Failed to using akce with order")
-    return akce_order
+async def use_akces_for_order(data: UseAkcesForm, db: AsyncSession = Depends(get_db),
+                              idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)) -> GettingOrder:
+    async def _use() -> GettingOrder:
+        akce_order = await use_akce(data, db)
+        if not akce_order:
+            raise HTTPException(status_code=400, detail="Failed to using akce with order")
+        return akce_order
+
+    # The route is open to the tills without a user, the card is the caller redeeming its points
+    return await run_idempotent(idempotency_key, f"PUT /order:card:{data.card_id}", data, db, _use)
@@ -1,11 +1,12 @@
 from enum import Enum
 from typing import Optional, List
-from datetime import date
+from datetime import date, datetime, timezone
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from sqlalchemy import BigInteger, Double, Date
 
+from src.config import ORDER_BATCH_MAX_SIZE
 from src.item.schema import GettingItem
 
 
@@ -26,9 +27,43 @@ class CreatingOrder(BaseModel):
     items: List[OrderItem]
 
 
+class GettingOrderItem(GettingItem):
+    """
+    Line of an order in the shape of GettingItem it always had. title, description,
+    ingredients and cost come from the snapshot taken at purchase; actualise_cost and
+    is_active describe the item today and are None once the item is deleted
+    """
+    actualise_cost: Optional[bool] = None
+    is_active: Optional[bool] = None
+    count: float
+
+
 class GettingOrder(BaseModel):
     id: int
     user_id: Optional[UUID] = None
     date: date
     cost: float
-    items: List[GettingItem]
+    items: List[GettingOrderItem]
+
+
+class CreatingBatchOrder(CreatingOrder):
+    # Время продажи на кассе; без него заказ датируется моментом записи
+    date: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_date(self):
+        if self.date is not None and self.date.tzinfo is not None:
+            self.date = self.date.astimezone(timezone.utc).replace(tzinfo=None)
+        if self.date is not None and self.date > datetime.utcnow():
+            raise ValueError("date of a sale cannot be in the future")
+        return self
+
+
+class CreatingOrderBatch(BaseModel):
+    orders: List[CreatingBatchOrder] = Field(..., min_length=1, max_length=ORDER_BATCH_MAX_SIZE)
+
+
+class OrderBatchResult(BaseModel):
+    index: int
+    order: Optional[GettingOrder] = None
+    error: Optional[str] = None
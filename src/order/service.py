@@ -1,148 +1,311 @@
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy import select, update, delete
 
-from src.item.service import get_item_by_id
+from src.item.model import item
+from src.item.schema import GettingItem, GettingIngredients
+from src.item.service import load_items
 from src.profile.service import get_profile_by_id
-from src.product.service import get_product_by_id
+from src.product.model import product
+from src.product.service import get_product_by_id, deduct_products
 from src.order.model import order, order_item, order_item_ingredient
-from src.order.schema import CreatingOrder, OrderItem, OrderItemIngredient, GettingOrder
+from src.order.schema import CreatingOrder, OrderItem, OrderItemIngredient, GettingOrder, GettingOrderItem, \
+    OrderBatchResult, CreatingBatchOrder
+from src.report.service import reopen_sales_rollups
+from src.pagination import Page, PageParams, apply_keyset, split_page
 
 
 async def create_order(order_data: CreatingOrder, db: AsyncSession) -> GettingOrder:
+    created_orders = await create_orders([order_data], db)
+    return created_orders[0]
+
+
+async def create_orders(orders: List[CreatingOrder], db: AsyncSession) -> List[GettingOrder]:
+    """
+    Creates the orders all or nothing: an unknown item or a stock shortage in any of
+    them fails the whole call
+    """
     try:
+        # Resolve every item of the carts at once and price the lines from that snapshot
+        item_ids = {line.item_id for order_data in orders for line in order_data.items}
+        items_by_id = await _load_cart_items(item_ids, db)
 
-        total_cost = 0
-        validated_items = []
+        missing_ids = item_ids - items_by_id.keys()
+        if missing_ids:
+            raise ValueError(f"Item with ID {min(missing_ids)} not found.")
 
+        # Списываем продукты до записи заказа, нехватка отклоняет весь заказ
+        await deduct_products(_stock_requirements(orders, items_by_id), db)
 
-        # Process each order item
-        for order_item_data in order_data.items:
-            item_info = await get_item_by_id(order_item_data.item_id, db)
-            if not item_info:
-                raise ValueError(f"Item with ID {order_item_data.item_id} not found.")
+        return await _insert_orders(orders, items_by_id, db)
 
-            # Calculate the cost of the item and its ingredients
-            item_cost = item_info.cost * order_item_data.count
+    except SQLAlchemyError as e:
+        # Rollback the transaction if any error occurs
+        await db.rollback()
+        print(f"Error occurred while creating order: {e}")
+        raise e
 
-            total_cost += item_cost
-            validated_items.append((order_item_data, item_info))
 
-        # Insert the new order
-        new_order_stmt = order.insert().values(
-            user_id=order_data.user_id,
-            cost=total_cost,
-            date=datetime.utcnow().date(),
-            comment=order_data.comment
-        )
-        result = await db.execute(new_order_stmt)
-        order_id = result.inserted_primary_key[0]
-
-        # Insert each order item and its ingredients
-        for order_item_data, item_info in validated_items:
-            # Вставляем запись в таблицу order_item и запрашиваем возврат id
-            new_order_item_stmt = order_item.insert().values(
-                order_id=order_id,
-                item_id=order_item_data.item_id,
-                count=order_item_data.count
-            ).returning(order_item.c.id)  # Запрашиваем возврат id вставленной строки
-
-            result = await db.execute(new_order_item_stmt)
-
-            # Получаем id созданной записи в order_item
-            order_item_id = result.fetchone()[0]  # Теперь это должно вернуть корректный id
-
-            # Проверка, что ингредиенты существуют и являются списком
-            if order_item_data.ingredients and isinstance(order_item_data.ingredients, list):
-                for ingredient_data in order_item_data.ingredients:
-                    await db.execute(
-                        order_item_ingredient.insert().values(
-                            order_item_id=order_item_id,
-                            product_id=ingredient_data.product_id,
-                            value=ingredient_data.value
-                        )
-                    )
-                    print(ingredient_data.value)
+async def create_orders_batch(orders: List[CreatingBatchOrder], db: AsyncSession) -> List[OrderBatchResult]:
+    """
+    Validates every order against one snapshot of the items and products it references,
+    then writes the valid ones with the same bulk inserts as create_order, dated by their
+    sale time when the till sent one. Invalid orders are reported in their result and do
+    not stop the rest of the batch
+    """
+    try:
+        items_by_id = await _load_cart_items({line.item_id for data in orders for line in data.items}, db)
+
+        product_ids = {ing.product_id for data in orders for line in data.items for ing in line.ingredients or []}
+        existing_product_ids = set((await db.execute(
+            select(product.c.id).where(product.c.id.in_(product_ids))
+        )).scalars().all()) if product_ids else set()
+
+        results: List[Optional[OrderBatchResult]] = [None] * len(orders)
+        accepted = []
+        for index, order_data in enumerate(orders):
+            missing_items = {line.item_id for line in order_data.items} - items_by_id.keys()
+            missing_products = {
+                ing.product_id for line in order_data.items for ing in line.ingredients or []
+            } - existing_product_ids
+
+            if missing_items:
+                results[index] = OrderBatchResult(index=index, error=f"Item with ID {min(missing_items)} not found.")
+            elif missing_products:
+                results[index] = OrderBatchResult(
+                    index=index, error=f"Product with ID {min(missing_products)} not found."
+                )
             else:
-                print(f"No ingredients for order item {order_item_data.item_id}")
+                accepted.append(index)
+
+        accepted_orders = [orders[index] for index in accepted]
 
-        # Commit the transaction
-        await db.commit()
+        # These orders were already served at the till, so a shortage is flagged, not rejected
+        short_product_ids = await deduct_products(
+            _stock_requirements(accepted_orders, items_by_id), db, allow_shortage=True
+        )
+        if short_product_ids:
+            print(f"Order batch took products {short_product_ids} below zero stock")
+
+        created_orders = await _insert_orders(accepted_orders, items_by_id, db)
+        sale_days = [data.date.date() for data in accepted_orders if data.date is not None]
+        if sale_days:
+            await reopen_sales_rollups(min(sale_days), db)
+        for index, created_order in zip(accepted, created_orders):
+            results[index] = OrderBatchResult(index=index, order=created_order)
 
-        # Return the newly created order
-        return await get_order_by_id(order_id, db)
+        return results
 
     except SQLAlchemyError as e:
-        # Rollback the transaction if any error occurs
         await db.rollback()
-        print(f"Error occurred while creating order: {e}")
+        print(f"Error occurred while creating order batch: {e}")
         raise e
 
 
-async def get_user_orders(user_id: UUID, db: AsyncSession) -> List[GettingOrder]:
-    try:
-        stmt = select(order).where(order.c.user_id == user_id)
-        result = await db.execute(stmt)
-        orders = result.fetchall()
-
-        user_orders = []
-        for order_row in orders:
-            order_id = order_row.id
-            order_items = await db.execute(
-                select(order_item).where(order_item.c.order_id == order_id)
+def _stock_requirements(orders: List[CreatingOrder], items_by_id: dict) -> Dict[int, float]:
+    """
+    Product quantities consumed by the orders: the recipe of every line plus its extra
+    ingredients, scaled by the line count
+    """
+    required: Dict[int, float] = {}
+    for data in orders:
+        for line in data.items:
+            for ing in items_by_id[line.item_id].ingredients or []:
+                if ing.product_id is not None:
+                    required[ing.product_id] = required.get(ing.product_id, 0.0) + ing.value * line.count
+            for extra in line.ingredients or []:
+                required[extra.product_id] = required.get(extra.product_id, 0.0) + extra.value * line.count
+    return required
+
+
+async def _load_cart_items(item_ids: set, db: AsyncSession) -> dict:
+    if not item_ids:
+        return {}
+
+    return {item_info.id: item_info for item_info in (await load_items(db, item.c.id.in_(item_ids))).items}
+
+
+async def _insert_orders(orders: List[CreatingOrder], items_by_id: dict, db: AsyncSession) -> List[GettingOrder]:
+    """
+    Inserts the orders, their lines and line ingredients with one executemany
+    INSERT per table, whatever the number of orders
+    """
+    if not orders:
+        return []
+
+    # Заказы кассы приходят со временем продажи, живые заказы датируются днём записи
+    today = datetime.utcnow().date()
+    order_dates = [getattr(data, "date", None) or today for data in orders]
+    totals = [sum(items_by_id[line.item_id].cost * line.count for line in data.items) for data in orders]
+
+    # id возвращаются в порядке переданных параметров
+    order_ids = (await db.execute(
+        order.insert().returning(order.c.id, sort_by_parameter_order=True),
+        [
+            {"user_id": data.user_id, "cost": total_cost, "date": order_date, "comment": data.comment}
+            for data, total_cost, order_date in zip(orders, totals, order_dates)
+        ]
+    )).scalars().all()
+
+    lines = [(order_id, line) for order_id, data in zip(order_ids, orders) for line in data.items]
+    if lines:
+        order_item_ids = (await db.execute(
+            order_item.insert().returning(order_item.c.id, sort_by_parameter_order=True),
+            [_order_item_values(order_id, line, items_by_id[line.item_id]) for order_id, line in lines]
+        )).scalars().all()
+
+        ingredient_rows = [
+            {"order_item_id": order_item_id, "product_id": ingredient_data.product_id,
+             "value": ingredient_data.value}
+            for order_item_id, (_, line) in zip(order_item_ids, lines)
+            for ingredient_data in line.ingredients or []
+        ]
+        if ingredient_rows:
+            await db.execute(order_item_ingredient.insert(), ingredient_rows)
+
+    return [
+        GettingOrder.model_construct(
+            id=order_id,
+            user_id=data.user_id,
+            date=order_date.date() if isinstance(order_date, datetime) else order_date,
+            cost=total_cost,
+            items=[_order_item_from_snapshot(items_by_id[line.item_id], line.count) for line in data.items]
+        )
+        for order_id, data, total_cost, order_date in zip(order_ids, orders, totals, order_dates)
+    ]
+
+
+def _order_item_values(order_id: int, line: OrderItem, item_info: GettingItem) -> dict:
+    # Строка заказа хранит цену, название и рецепт такими, какими они были при покупке
+    return {
+        "order_id": order_id,
+        "item_id": line.item_id,
+        "count": line.count,
+        "unit_price": item_info.cost,
+        "title": item_info.title,
+        "description": item_info.description,
+        "ingredients": [ing.model_dump() for ing in item_info.ingredients or []],
+    }
+
+
+def _order_item_from_snapshot(item_info: GettingItem, count: float) -> GettingOrderItem:
+    return GettingOrderItem.model_construct(
+        id=item_info.id,
+        title=item_info.title,
+        description=item_info.description,
+        ingredients=list(item_info.ingredients or []),
+        cost=item_info.cost,
+        actualise_cost=item_info.actualise_cost,
+        is_active=item_info.is_active,
+        count=count
+    )
+
+
+def _order_lines_query(orders=order):
+    """
+    Orders joined with their snapshot lines and the current flags of the line items;
+    orders can be a subquery over the order table, e.g. one page of a history
+    """
+    return (
+        select(
+            orders.c.id,
+            orders.c.user_id,
+            orders.c.date,
+            orders.c.cost,
+            order_item.c.item_id,
+            order_item.c.count,
+            order_item.c.unit_price,
+            order_item.c.title,
+            order_item.c.description,
+            order_item.c.ingredients,
+            item.c.actualise_cost,
+            item.c.is_active
+        )
+        .select_from(
+            orders.outerjoin(order_item, order_item.c.order_id == orders.c.id)
+            .outerjoin(item, item.c.id == order_item.c.item_id)
+        )
+    )
+
+
+def _orders_from_rows(rows) -> List[GettingOrder]:
+    """
+    Groups the joined order/order_item rows into orders, keeping the row order
+    """
+    orders_by_id = {}
+    for row in rows:
+        order_info = orders_by_id.get(row.id)
+        if order_info is None:
+            order_info = orders_by_id[row.id] = GettingOrder.model_construct(
+                id=row.id,
+                user_id=row.user_id,
+                date=row.date.date() if isinstance(row.date, datetime) else row.date,
+                cost=row.cost,
+                items=[]
             )
 
-            order_items_info = []
-            for order_item_row in order_items:
-                item_info = await get_item_by_id(order_item_row.item_id, db)
-                order_items_info.append(item_info)
-
-            user_orders.append(
-                GettingOrder(
-                    id=order_row.id,
-                    user_id=order_row.user_id,
-                    date=order_row.date,
-                    cost=order_row.cost,
-                    items=order_items_info
-                )
-            )
+        if row.item_id is not None:
+            order_info.items.append(GettingOrderItem.model_construct(
+                id=row.item_id,
+                title=row.title,
+                description=row.description,
+                ingredients=[GettingIngredients.model_construct(**ing) for ing in row.ingredients],
+                cost=row.unit_price,
+                actualise_cost=row.actualise_cost,
+                is_active=row.is_active,
+                count=row.count
+            ))
+
+    return list(orders_by_id.values())
 
-        return user_orders
+
+async def get_user_orders(user_id: UUID, db: AsyncSession, page: Optional[PageParams] = None) -> Page[GettingOrder]:
+    try:
+        # Newest first, keyset on (date, id). The page is cut in a subquery and joined with
+        # its lines, so the whole history page is one query however many orders it holds
+        orders_page = apply_keyset(
+            select(order.c.id, order.c.user_id, order.c.date, order.c.cost).where(order.c.user_id == user_id),
+            [order.c.date, order.c.id], page, descending=True
+        ).subquery("orders_page")
+
+        result = await db.execute(
+            _order_lines_query(orders_page)
+            .order_by(orders_page.c.date.desc(), orders_page.c.id.desc(), order_item.c.id)
+        )
+        rows = result.fetchall()
+
+        order_keys = {row.id: (row.date, row.id) for row in rows}
+        orders, next_cursor = split_page(_orders_from_rows(rows), page, key=lambda o: order_keys[o.id])
+
+        return Page(items=orders, next_cursor=next_cursor)
 
     except SQLAlchemyError as e:
         print(f"Error occurred while fetching user orders: {e}")
         raise e
 
 
-async def get_order_by_id(order_id: int, db: AsyncSession) -> GettingOrder:
+async def get_order_by_id(order_id: int, db: AsyncSession, order_date: Optional[date] = None,
+                          for_update: bool = False) -> GettingOrder:
     try:
-        stmt = select(order).where(order.c.id == order_id)
-        result = await db.execute(stmt)
-        order_row = result.fetchone()
-
-        if not order_row:
+        stmt = _order_lines_query().where(order.c.id == order_id)
+        if for_update:
+            # Only the order row is locked, its lines are the outer side of the join
+            stmt = stmt.with_for_update(of=order)
+        if order_date is not None:
+            # Known date: only the partition of that month is read
+            stmt = stmt.where(order.c.date >= order_date, order.c.date < order_date + timedelta(days=1))
+
+        result = await db.execute(stmt.order_by(order_item.c.id))
+        orders = _orders_from_rows(result.fetchall())
+
+        if not orders:
             raise ValueError(f"Order with ID {order_id} not found.")
 
-        order_items = await db.execute(
-            select(order_item).where(order_item.c.order_id == order_id)
-        )
-        order_items_info = []
-
-        for order_item_row in order_items:
-            item_info = await get_item_by_id(order_item_row.item_id, db)
-            order_items_info.append(item_info)
-
-        return GettingOrder(
-            id=order_row.id,
-            user_id=order_row.user_id,
-            date=order_row.date,
-            cost=order_row.cost,
-            items=order_items_info
-        )
+        return orders[0]
 
     except SQLAlchemyError as e:
         print(f"Error occurred while fetching order by ID: {e}")
@@ -157,7 +320,6 @@ async def update_order_total_price(order_id: int, total_price: float, db: AsyncS
             .values(cost=total_price)
         )
         await db.execute(stmt)
-        await db.commit()
     except SQLAlchemyError as e:
         await db.rollback()
         print(f"Database error while updating order total price: {e}")
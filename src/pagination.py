@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+
+from src.config import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT
+
+T = TypeVar("T")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(BaseModel):
+    limit: int = PAGE_DEFAULT_LIMIT
+    after: Optional[str] = None
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+def page_params(limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+                after: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header")) -> PageParams:
+    return PageParams(limit=limit, after=after)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("Cursor does not match the keyset")
+
+        decoded = []
+        for value, column in zip(values, columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def apply_keyset(stmt: Select, columns: Sequence, page: Optional[PageParams], descending: bool = False) -> Select:
+    """
+    Orders the statement by the keyset columns and, when a page is requested, seeks
+    past its cursor and fetches one extra row to know whether another page exists
+    """
+    stmt = stmt.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    if page is None:
+        return stmt
+
+    if page.after:
+        cursor = decode_cursor(page.after, columns)
+        key = tuple_(*columns)
+        values = tuple_(*cursor)
+        stmt = stmt.where(key < values if descending else key > values)
+        # The planner cannot prune partitions or bound an index scan from a row
+        # comparison, a plain bound on the leading column lets it do both
+        stmt = stmt.where(columns[0] <= cursor[0] if descending else columns[0] >= cursor[0])
+
+    return stmt.limit(page.limit + 1)
+
+
+def split_page(rows: Sequence, page: Optional[PageParams], key: Callable[[Any], Tuple]) -> Tuple[list, Optional[str]]:
+    rows = list(rows)
+    if page is None or len(rows) <= page.limit:
+        return rows, None
+
+    rows = rows[:page.limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
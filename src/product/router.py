@@ -1,6 +1,6 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
@@ -8,7 +8,10 @@ from starlette import status
 
 from src.auth.models import User
 from src.dependencies import get_db, permission_dependency
-from src.product.service import create_new_product, add_portion_of_exist_product, remove_portion_of_exist_product, get_product_by_id, get_all_products
+from src.pagination import PageParams, page_params, set_next_cursor
+from src.responses import trusted_json
+from src.product.service import create_new_product, add_portion_of_exist_product, remove_portion_of_exist_product, get_product_by_id, get_all_products, \
+    InsufficientStockError
 from src.product.schema import GettingProduct, CreationProduct, AddingProduct, ReducingProduct
 
 router = APIRouter(
@@ -37,7 +40,10 @@ async def add_product(product_id: int, product: AddingProduct, db: AsyncSession
 @router.put("/reduce/{product_id}", response_model=GettingProduct)
 async def reduce_product(product_id: int, product: ReducingProduct, db: AsyncSession = Depends(get_db),
                          user: User = Depends(permission_dependency("change_product"))) -> GettingProduct:
-    updated_product = await remove_portion_of_exist_product(product_id, product.value, db)
+    try:
+        updated_product = await remove_portion_of_exist_product(product_id, product.value, db)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"message": str(e), "products": e.shortages})
     if not updated_product:
         raise HTTPException(status_code=400, detail="Failed to update product")
     return updated_product
@@ -52,5 +58,8 @@ async def get_product(product_id: int, db: AsyncSession = Depends(get_db)) -> Ge
 
 
 @router.get("", response_model=List[GettingProduct])
-async def get_products(db: AsyncSession = Depends(get_db)) -> list[GettingProduct]:
-    return await get_all_products(db)
+async def get_products(response: Response, page: PageParams = Depends(page_params),
+                       db: AsyncSession = Depends(get_db)) -> list[GettingProduct]:
+    products = await get_all_products(db, page)
+    set_next_cursor(response, products)
+    return trusted_json(products.items, response)
@@ -1,15 +1,28 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, values, column, BigInteger, Double
 
 from src.allergen.schema import GettingAllergen
 from src.product.model import product, product_value_type, shop_product, allergen_product
 from src.product.schema import CreationProduct, GettingProduct, AddingProduct
 from src.allergen.model import allergen
 from src.allergen.service import get_allergens_by_ids
+from src.pagination import Page, PageParams, apply_keyset, split_page
+from src.cache import catalog_cache, cache_key
+
+
+class InsufficientStockError(Exception):
+    """
+    Raised by deduct_products when some products do not have the required quantity.
+    shortages lists them as dicts of product_id, required and available
+    """
+
+    def __init__(self, shortages: List[dict]):
+        super().__init__("Not enough stock")
+        self.shortages = shortages
 
 
 async def create_new_product(data: CreationProduct, db: AsyncSession) -> Optional[GettingProduct]:
@@ -24,6 +37,7 @@ async def create_new_product(data: CreationProduct, db: AsyncSession) -> Optiona
         )
         result = await db.execute(new_product_stmt)
         product_id = result.inserted_primary_key[0]
+        catalog_cache.mark_stale(db, "products")
 
         # Insert allergens for the product if provided
         if data.allergens:
@@ -32,8 +46,6 @@ async def create_new_product(data: CreationProduct, db: AsyncSession) -> Optiona
             ])
             await db.execute(allergen_product_stmt)
 
-        # Commit the transaction
-        await db.commit()
         allergen_names = await get_allergen_names_by_ids(data.allergens, db) if data.allergens else []
         print(allergen_names)
         # Return the newly created product
@@ -63,7 +75,6 @@ async def get_or_create_value_type(value_type: str, db: AsyncSession) -> int:
         else:
             new_value_type_stmt = insert(product_value_type).values(name=value_type)
             result = await db.execute(new_value_type_stmt)
-            await db.commit()
             return result.inserted_primary_key[0]
 
     except SQLAlchemyError as e:
@@ -123,7 +134,7 @@ async def get_allergen_names_by_ids(allergen_ids: List[int], db: AsyncSession) -
 
 
 async def add_portion_of_exist_product(product_id: int, data: AddingProduct, db: AsyncSession) -> Optional[GettingProduct]:
-    from src.item.service import change_items_state_for_product
+    from src.item.service import refresh_item_availability, refresh_item_costs_for_product
 
     try:
         existing_product = await get_product_by_id(product_id, db)
@@ -144,6 +155,7 @@ async def add_portion_of_exist_product(product_id: int, data: AddingProduct, db:
             cost_per_one=new_unit_cost
         )
         await db.execute(update_product_stmt)
+        catalog_cache.mark_stale(db, "products", "items")
 
         if data.shop_id:
             new_shop_product_stmt = insert(shop_product).values(
@@ -153,9 +165,8 @@ async def add_portion_of_exist_product(product_id: int, data: AddingProduct, db:
             )
             await db.execute(new_shop_product_stmt)
 
-        await db.commit()
-
-        await change_items_state_for_product(product_id, new_value, db)
+        await refresh_item_availability([product_id], db)
+        await refresh_item_costs_for_product(product_id, db)
 
         return await get_product_by_id(product_id, db)
 
@@ -166,8 +177,6 @@ async def add_portion_of_exist_product(product_id: int, data: AddingProduct, db:
 
 
 async def remove_portion_of_exist_product(product_id: int, value: float, db: AsyncSession) -> Optional[GettingProduct]:
-    from src.item.service import change_items_state_for_product
-
     try:
         existing_product = await get_product_by_id(product_id, db)
 
@@ -175,32 +184,78 @@ async def remove_portion_of_exist_product(product_id: int, value: float, db: Asy
             print(f"Product with id {product_id} not found")
             raise ValueError(f"Product with ID {product_id} not found.")
 
-        new_value = existing_product.value - value
+        await deduct_products({product_id: value}, db)
+        return await get_product_by_id(product_id, db)
 
-        if new_value < 0:
-            raise ValueError(f"Cannot remove more than available quantity. Current value: {existing_product.value}")
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while removing portion of product: {e}")
+        raise e
 
-        update_product_stmt = update(product).where(product.c.id == product_id).values(
-            value=new_value,
-        )
-        await db.execute(update_product_stmt)
 
-        await db.commit()
+async def deduct_products(quantities: Dict[int, float], db: AsyncSession, allow_shortage: bool = False) -> List[int]:
+    """
+    Subtracts the quantities from stock in one UPDATE ... FROM (VALUES ...) RETURNING.
+    The subtraction happens in the database, so concurrent deductions cannot lose each
+    other's updates. A product without enough stock raises InsufficientStockError,
+    unless allow_shortage is set: then stock goes negative and the short products
+    are returned. Availability is re-evaluated for the touched products only
+    """
+    from src.item.service import refresh_item_availability
 
-        await change_items_state_for_product(product_id, new_value, db)
-        return await get_product_by_id(product_id, db)
+    try:
+        quantities = {product_id: qty for product_id, qty in quantities.items() if qty > 0}
+        if not quantities:
+            return []
+
+        need = values(
+            column("product_id", BigInteger), column("qty", Double), name="need"
+        ).data(sorted(quantities.items()))
+
+        deduct_stmt = (
+            update(product)
+            .where(product.c.id == need.c.product_id)
+            .values(value=product.c.value - need.c.qty)
+            .returning(product.c.id, product.c.value)
+        )
+        if not allow_shortage:
+            deduct_stmt = deduct_stmt.where(product.c.value >= need.c.qty)
+
+        deducted = {row.id: row.value for row in (await db.execute(deduct_stmt)).fetchall()}
+        short_ids = sorted(quantities.keys() - deducted.keys()) if not allow_shortage \
+            else sorted(product_id for product_id, left in deducted.items() if left < 0)
+
+        if short_ids and not allow_shortage:
+            available = dict((await db.execute(
+                select(product.c.id, product.c.value).where(product.c.id.in_(short_ids))
+            )).fetchall())
+            raise InsufficientStockError([
+                {"product_id": product_id, "required": quantities[product_id], "available": available.get(product_id)}
+                for product_id in short_ids
+            ])
+
+        # Stock is part of the product listing; items go stale only if their availability flips
+        catalog_cache.mark_stale(db, "products")
+        await refresh_item_availability(deducted.keys(), db)
+        return short_ids
 
     except SQLAlchemyError as e:
         await db.rollback()
-        print(f"Error occurred while removing portion of product: {e}")
+        print(f"Error occurred while deducting products: {e}")
         raise e
 
 
-async def get_all_products(db: AsyncSession) -> List[GettingProduct]:
-    from src.allergen.model import allergen
+async def get_all_products(db: AsyncSession, page: Optional[PageParams] = None) -> Page[GettingProduct]:
+    return await catalog_cache.get_or_load(
+        "products", cache_key(page.limit, page.after) if page else "all",
+        lambda: _load_products(db, page)
+    )
+
+
+async def _load_products(db: AsyncSession, page: Optional[PageParams]) -> Page[GettingProduct]:
     try:
-        # Запрос на получение всех продуктов
-        query = await db.execute(
+        # Запрос на получение страницы продуктов
+        query = await db.execute(apply_keyset(
             select(
                 product.c.id,
                 product.c.name,
@@ -209,36 +264,36 @@ async def get_all_products(db: AsyncSession) -> List[GettingProduct]:
                 product.c.cost_per_one
             ).join(
                 product_value_type, product.c.value_type_id == product_value_type.c.id
-            )
-        )
-
-        products = query.fetchall()
+            ),
+            [product.c.id], page
+        ))
 
-        all_products = []
+        products, next_cursor = split_page(query.fetchall(), page, key=lambda row: (row.id,))
 
-        # Перебираем каждый продукт и получаем для него аллергены
-        for product_data in products:
-            # Запрос на получение аллергенов для каждого продукта
+        # Аллергены для всех продуктов страницы одним запросом
+        allergen_names_by_product = {}
+        if products:
             allergen_query = await db.execute(
-                select(allergen.c.id, allergen.c.name)
+                select(allergen_product.c.product_id, allergen.c.name)
                 .join(allergen_product, allergen.c.id == allergen_product.c.allergen_id)
-                .filter(allergen_product.c.product_id == product_data.id)
+                .filter(allergen_product.c.product_id.in_([product_data.id for product_data in products]))
             )
+            for row in allergen_query.fetchall():
+                allergen_names_by_product.setdefault(row.product_id, []).append(row.name)
 
-            allergens = allergen_query.fetchall()
-            allergen_names = [allergen.name for allergen in allergens]
-
-            # Добавляем продукт в список
-            all_products.append(GettingProduct(
+        all_products = [
+            GettingProduct.model_construct(
                 id=product_data.id,
                 name=product_data.name,
                 value=product_data.value,
                 value_type=product_data.value_type,
                 unit_cost=product_data.cost_per_one,
-                allergens=allergen_names
-            ))
+                allergens=allergen_names_by_product.get(product_data.id, [])
+            )
+            for product_data in products
+        ]
 
-        return all_products
+        return Page(items=all_products, next_cursor=next_cursor)
 
     except SQLAlchemyError as e:
         await db.rollback()
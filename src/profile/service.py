@@ -54,8 +54,6 @@ async def update_profile(user_id: UUID, profile: UpdatingProfile, db: AsyncSessi
             stmt = user_allergen.insert().values(user_id=user_id, allergen_id=allergen.allergen_id)
             await db.execute(stmt)
 
-        await db.commit()
-
         return await get_profile_by_id(user_id, db)
     except IntegrityError as e:
         await db.rollback()
@@ -70,7 +68,6 @@ async def change_evaluation(user_id: UUID, value: float, db: AsyncSession) -> No
             .values(evaluation=value)
         )
         await db.execute(stmt)
-        await db.commit()
     except SQLAlchemyError as e:
         await db.rollback()
         raise SQLAlchemyError(f"Error updating evaluation: {str(e)}")
@@ -89,7 +86,6 @@ async def create_preference(preference: CreatingPreference, db: AsyncSession) ->
             max_value=preference.max_value
         )
         result = await db.execute(stmt)
-        await db.commit()
 
         # Return the newly created preference
         return GettingPreference(
@@ -195,7 +191,6 @@ async def delete_preference(preference_id: int, db: AsyncSession) -> None:
     try:
         stmt = delete(preference).where(preference.c.id == preference_id)
         await db.execute(stmt)
-        await db.commit()
     except SQLAlchemyError as e:
         await db.rollback()
         raise e
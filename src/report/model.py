@@ -0,0 +1,40 @@
+from sqlalchemy import Table, Column, Integer, String, Date, BigInteger, Double
+
+from ..database import metadata
+
+# Дневные агрегаты продаж, пересчитываются от watermark, отчёты читают только их
+sales_daily = Table(
+    "sales_daily",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("orders", Integer, nullable=False),
+    Column("revenue", Double, nullable=False),
+    Column("units", Double, nullable=False),
+)
+
+sales_item_daily = Table(
+    "sales_item_daily",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("item_id", BigInteger, primary_key=True),
+    Column("title", String, nullable=False),
+    Column("units", Double, nullable=False),
+    Column("revenue", Double, nullable=False),
+)
+
+ingredient_consumption_daily = Table(
+    "ingredient_consumption_daily",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("product_id", BigInteger, primary_key=True),
+    Column("quantity", Double, nullable=False),
+)
+
+report_watermark = Table(
+    "report_watermark",
+    metadata,
+    Column("name", String, primary_key=True),
+    # Last day included in the rollups; it is recomputed on the next refresh
+    # because orders may still have arrived for it
+    Column("day", Date, nullable=False),
+)
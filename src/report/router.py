@@ -0,0 +1,42 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import User
+from src.dependencies import get_db, permission_dependency
+from src.responses import trusted_json
+from src.report.schema import GettingDailySales, GettingDailyItemSales, GettingDailyConsumption, RefreshResult
+from src.report.service import refresh_sales_rollups, get_daily_sales, get_daily_item_sales, get_daily_consumption
+
+router = APIRouter(
+    prefix="/report",
+)
+
+
+@router.get("/sales", response_model=List[GettingDailySales])
+async def get_sales(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                    db: AsyncSession = Depends(get_db),
+                    user: User = Depends(permission_dependency("get_reports"))) -> List[GettingDailySales]:
+    return trusted_json(await get_daily_sales(db, date_from, date_to))
+
+
+@router.get("/items", response_model=List[GettingDailyItemSales])
+async def get_item_sales(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         item_id: Optional[int] = None, db: AsyncSession = Depends(get_db),
+                         user: User = Depends(permission_dependency("get_reports"))) -> List[GettingDailyItemSales]:
+    return trusted_json(await get_daily_item_sales(db, date_from, date_to, item_id))
+
+
+@router.get("/ingredients", response_model=List[GettingDailyConsumption])
+async def get_consumption(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                          product_id: Optional[int] = None, db: AsyncSession = Depends(get_db),
+                          user: User = Depends(permission_dependency("get_reports"))) -> List[GettingDailyConsumption]:
+    return trusted_json(await get_daily_consumption(db, date_from, date_to, product_id))
+
+
+@router.post("/refresh", response_model=RefreshResult)
+async def refresh_reports(db: AsyncSession = Depends(get_db),
+                          user: User = Depends(permission_dependency("get_reports"))) -> RefreshResult:
+    return await refresh_sales_rollups(db)
@@ -0,0 +1,30 @@
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class GettingDailySales(BaseModel):
+    day: date
+    orders: int
+    revenue: float
+    units: float
+
+
+class GettingDailyItemSales(BaseModel):
+    day: date
+    item_id: int
+    title: str
+    units: float
+    revenue: float
+
+
+class GettingDailyConsumption(BaseModel):
+    day: date
+    product_id: int
+    quantity: float
+
+
+class RefreshResult(BaseModel):
+    refreshed_from: Optional[date] = None
+    refreshed_until: Optional[date] = None
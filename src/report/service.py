@@ -0,0 +1,204 @@
+import asyncio
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import select, delete, insert, func, cast, text, true, union_all, literal_column, Date, BigInteger
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import REPORT_REFRESH_INTERVAL
+from src.database import unit_of_work
+from src.order.model import order, order_item, order_item_ingredient
+from src.report.model import sales_daily, sales_item_daily, ingredient_consumption_daily, report_watermark
+from src.report.schema import GettingDailySales, GettingDailyItemSales, GettingDailyConsumption, RefreshResult
+
+WATERMARK_NAME = "sales"
+
+
+def _orders_since(from_day: date):
+    # Plain bound on the partition key, only the partitions from from_day on are read
+    return order.c.date >= datetime.combine(from_day, datetime.min.time())
+
+
+async def refresh_sales_rollups(db: AsyncSession) -> RefreshResult:
+    """
+    Recomputes the daily rollups from the watermark day up to today and moves the
+    watermark. Days before the watermark are final and never touched again
+    """
+    try:
+        # Один пересчёт за раз: параллельный запуск дождётся завершения первого
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('sales_rollups'))"))
+
+        from_day = (await db.execute(
+            select(report_watermark.c.day).where(report_watermark.c.name == WATERMARK_NAME)
+        )).scalar()
+        if from_day is None:
+            first_order = (await db.execute(select(func.min(order.c.date)))).scalar()
+            if first_order is None:
+                return RefreshResult()
+            from_day = first_order.date()
+
+        today = datetime.utcnow().date()
+        order_day = cast(order.c.date, Date)
+
+        for table in (sales_daily, sales_item_daily, ingredient_consumption_daily):
+            await db.execute(delete(table).where(table.c.day >= from_day))
+
+        orders_per_day = (
+            select(order_day.label("day"), func.count().label("orders"), func.sum(order.c.cost).label("revenue"))
+            .where(_orders_since(from_day))
+            .group_by(order_day)
+            .subquery("orders_per_day")
+        )
+        units_per_day = (
+            select(order_day.label("day"), func.sum(order_item.c.count).label("units"))
+            .select_from(order.join(order_item, order_item.c.order_id == order.c.id))
+            .where(_orders_since(from_day))
+            .group_by(order_day)
+            .subquery("units_per_day")
+        )
+        await db.execute(insert(sales_daily).from_select(
+            ["day", "orders", "revenue", "units"],
+            select(orders_per_day.c.day, orders_per_day.c.orders, orders_per_day.c.revenue,
+                   func.coalesce(units_per_day.c.units, 0.0))
+            .select_from(orders_per_day.outerjoin(units_per_day, units_per_day.c.day == orders_per_day.c.day))
+        ))
+
+        await db.execute(insert(sales_item_daily).from_select(
+            ["day", "item_id", "title", "units", "revenue"],
+            select(order_day, order_item.c.item_id, func.max(order_item.c.title), func.sum(order_item.c.count),
+                   func.sum(order_item.c.count * order_item.c.unit_price))
+            .select_from(order.join(order_item, order_item.c.order_id == order.c.id))
+            .where(_orders_since(from_day))
+            .group_by(order_day, order_item.c.item_id)
+        ))
+
+        # Recipe snapshot of the line plus its extra ingredients, both scaled by the line count
+        recipe = func.json_array_elements(order_item.c.ingredients).table_valued(
+            literal_column("value", JSON)
+        ).lateral("recipe")
+        recipe_usage = (
+            select(order_day.label("day"),
+                   cast(recipe.c.value["product_id"].astext, BigInteger).label("product_id"),
+                   (cast(recipe.c.value["value"].astext, order_item.c.count.type) * order_item.c.count).label("quantity"))
+            .select_from(order.join(order_item, order_item.c.order_id == order.c.id).join(recipe, true()))
+            .where(_orders_since(from_day), recipe.c.value["product_id"].astext.is_not(None))
+        )
+        extra_usage = (
+            select(order_day.label("day"), order_item_ingredient.c.product_id,
+                   (order_item_ingredient.c.value * order_item.c.count).label("quantity"))
+            .select_from(
+                order.join(order_item, order_item.c.order_id == order.c.id)
+                .join(order_item_ingredient, order_item_ingredient.c.order_item_id == order_item.c.id)
+            )
+            .where(_orders_since(from_day))
+        )
+        usage = union_all(recipe_usage, extra_usage).subquery("usage")
+        await db.execute(insert(ingredient_consumption_daily).from_select(
+            ["day", "product_id", "quantity"],
+            select(usage.c.day, usage.c.product_id, func.sum(usage.c.quantity))
+            .group_by(usage.c.day, usage.c.product_id)
+        ))
+
+        await db.execute(
+            report_watermark.delete().where(report_watermark.c.name == WATERMARK_NAME)
+        )
+        await db.execute(report_watermark.insert().values(name=WATERMARK_NAME, day=today))
+
+        return RefreshResult(refreshed_from=from_day, refreshed_until=today)
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while refreshing sales rollups: {e}")
+        raise e
+
+
+async def reopen_sales_rollups(day: date, db: AsyncSession) -> None:
+    """
+    Moves the watermark back to day, so the next refresh recomputes the rollups of
+    orders written with an earlier sale date than the days already final
+    """
+    try:
+        # Та же блокировка, что у пересчёта: иначе он может перезаписать watermark поверх нас
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('sales_rollups'))"))
+        await db.execute(
+            report_watermark.update()
+            .where(report_watermark.c.name == WATERMARK_NAME, report_watermark.c.day > day)
+            .values(day=day)
+        )
+
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error occurred while reopening sales rollups: {e}")
+        raise e
+
+
+def _day_range(table, date_from: Optional[date], date_to: Optional[date]) -> list:
+    criteria = []
+    if date_from is not None:
+        criteria.append(table.c.day >= date_from)
+    if date_to is not None:
+        criteria.append(table.c.day <= date_to)
+    return criteria
+
+
+async def get_daily_sales(db: AsyncSession, date_from: Optional[date] = None,
+                          date_to: Optional[date] = None) -> List[GettingDailySales]:
+    try:
+        result = await db.execute(
+            select(sales_daily).where(*_day_range(sales_daily, date_from, date_to)).order_by(sales_daily.c.day)
+        )
+        return [GettingDailySales.model_construct(**row._mapping) for row in result.fetchall()]
+
+    except SQLAlchemyError as e:
+        print(f"Error occurred while fetching daily sales: {e}")
+        raise e
+
+
+async def get_daily_item_sales(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                               item_id: Optional[int] = None) -> List[GettingDailyItemSales]:
+    try:
+        criteria = _day_range(sales_item_daily, date_from, date_to)
+        if item_id is not None:
+            criteria.append(sales_item_daily.c.item_id == item_id)
+
+        result = await db.execute(
+            select(sales_item_daily).where(*criteria).order_by(sales_item_daily.c.day, sales_item_daily.c.item_id)
+        )
+        return [GettingDailyItemSales.model_construct(**row._mapping) for row in result.fetchall()]
+
+    except SQLAlchemyError as e:
+        print(f"Error occurred while fetching daily item sales: {e}")
+        raise e
+
+
+async def get_daily_consumption(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                                product_id: Optional[int] = None) -> List[GettingDailyConsumption]:
+    try:
+        criteria = _day_range(ingredient_consumption_daily, date_from, date_to)
+        if product_id is not None:
+            criteria.append(ingredient_consumption_daily.c.product_id == product_id)
+
+        result = await db.execute(
+            select(ingredient_consumption_daily).where(*criteria)
+            .order_by(ingredient_consumption_daily.c.day, ingredient_consumption_daily.c.product_id)
+        )
+        return [GettingDailyConsumption.model_construct(**row._mapping) for row in result.fetchall()]
+
+    except SQLAlchemyError as e:
+        print(f"Error occurred while fetching daily ingredient consumption: {e}")
+        raise e
+
+
+async def refresh_sales_rollups_periodically() -> None:
+    """
+    Lifespan task keeping the rollups at most REPORT_REFRESH_INTERVAL seconds behind
+    """
+    while True:
+        try:
+            async with unit_of_work() as db:
+                await refresh_sales_rollups(db)
+        except Exception as e:
+            print(f"Sales rollup refresh failed: {e}")
+        await asyncio.sleep(REPORT_REFRESH_INTERVAL)
@@ -0,0 +1,78 @@
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Optional, Type
+
+import orjson
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+from src.config import FAST_JSON
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson response that also accepts pydantic models, so routes can hand over the
+    models they already have without a jsonable_encoder pass
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Routes can opt out of the fast path with response_class=JSONResponse
+default_response_class = FastJSONResponse if FAST_JSON else JSONResponse
+
+
+_route_response_class: ContextVar[Optional[type]] = ContextVar("route_response_class", default=None)
+
+
+async def remember_response_class(request: Request) -> None:
+    """
+    App-wide dependency recording the response class of the matched route, so the
+    helpers below answer in the format the route declared
+    """
+    response_class = getattr(request.scope.get("route"), "response_class", None)
+    if isinstance(response_class, DefaultPlaceholder):
+        response_class = response_class.value
+    _route_response_class.set(response_class)
+
+
+def json_response_class() -> Type[Response]:
+    response_class = _route_response_class.get()
+    if isinstance(response_class, type) and issubclass(response_class, (JSONResponse, ORJSONResponse)):
+        return response_class
+    return default_response_class
+
+
+def trusted_json(content: Any, response: Optional[Response] = None, status_code: Optional[int] = None) -> Any:
+    """
+    Returns models built by the services from database rows straight to the client.
+    FastAPI skips the response_model re-validation for a returned Response, so the
+    headers set on the injected response are copied over. Unless the route answers
+    with FastJSONResponse (FAST_JSON on and no opt-out), the content is returned as is
+    and goes through the usual validation.
+    """
+    response_class = json_response_class()
+    if not issubclass(response_class, FastJSONResponse):
+        return content
+
+    fast_response = response_class(
+        content=content,
+        status_code=status_code or (response.status_code if response and response.status_code else 200)
+    )
+    if response is not None:
+        fast_response.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"content-type")
+        )
+    return fast_response
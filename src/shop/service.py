@@ -13,7 +13,6 @@ async def create_shop(shop_data: CreatingShop, db: AsyncSession) -> Optional[Get
     try:
         stmt = insert(shop).values(name=shop_data.name).returning(shop.c.id, shop.c.name)
         result = await db.execute(stmt)
-        await db.commit()
 
         shop_row = result.fetchone()
 
@@ -34,7 +33,6 @@ async def delete_shop(shop_id: int, db: AsyncSession) -> bool:
 
         stmt = delete(shop).where(shop.c.id == shop_id)
         result = await db.execute(stmt)
-        await db.commit()
 
         return result.rowcount > 0
 
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import select
+
+from conftest import async_session_maker
+from src.database import unit_of_work
+from src.card.model import bonus_card
+from src.order.model import order
+from src.event.schema import CreatingEvent
+from src.event.service import create_events
+
+REDEMPTIONS = 300
+# Points for only half of the redemptions: the other half must be refused, not overdrawn
+STARTING_POINTS = REDEMPTIONS // 2
+# Ниже max_connections Postgres: у тестового движка NullPool, каждый запрос держит своё соединение
+PARALLEL_REQUESTS = 50
+
+
+@pytest.mark.asyncio
+async def test_parallel_redemptions_lose_no_points(ac: AsyncClient):
+    async with unit_of_work(async_session_maker) as db:
+        card_id = (await db.execute(
+            bonus_card.insert().values(phone="+420000000300", count=STARTING_POINTS, used_points=0)
+            .returning(bonus_card.c.id)
+        )).scalar()
+        order_id = (await db.execute(
+            order.insert().values(cost=1000.0, date=datetime.utcnow()).returning(order.c.id)
+        )).scalar()
+        created_events = await create_events([CreatingEvent(
+            title="Stress test akce",
+            criteria=[{"contrast": "greater_than", "value": 0.5}],
+            benefits=[
+                {"action": "reduce_card_bonuses", "value": 1},
+                {"action": "reduce_order_sum", "value": 1}
+            ]
+        )], db)
+    akce_id = created_events[0].id
+
+    semaphore = asyncio.Semaphore(PARALLEL_REQUESTS)
+
+    async def redeem():
+        async with semaphore:
+            return await ac.put("/api/v1/order", json={
+                "card_id": card_id,
+                "order_id": order_id,
+                "akce_ids": [akce_id]
+            })
+
+    responses = await asyncio.gather(*(redeem() for _ in range(REDEMPTIONS)))
+    succeeded = sum(response.status_code == status.HTTP_200_OK for response in responses)
+
+    async with unit_of_work(async_session_maker) as db:
+        card_row = (await db.execute(select(bonus_card).where(bonus_card.c.id == card_id))).fetchone()
+        order_cost = (await db.execute(select(order.c.cost).where(order.c.id == order_id))).scalar()
+
+    # Every redemption saw the result of the previous one: no point spent twice, none lost
+    assert card_row.count == STARTING_POINTS - succeeded
+    assert card_row.used_points == succeeded
+    assert order_cost == pytest.approx(1000.0 - succeeded)
+    # The criterion needs a point left, so exactly the starting points could be redeemed
+    assert succeeded == STARTING_POINTS
+    assert card_row.count == 0
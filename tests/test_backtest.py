@@ -0,0 +1,104 @@
+import uuid
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from src.card.schema import GettingCard
+from src.event.backtest import OrderColumns, evaluate_event
+from src.event.rules import RuleSet
+from src.event.schema import BacktestForm, CreatingEvent, GettingEvent
+from src.order.schema import GettingOrder, GettingOrderItem
+
+ORDERS = 3000
+
+
+def _random_orders(rng: np.random.Generator) -> OrderColumns:
+    line_count = rng.integers(0, 5, ORDERS)
+    line_order = np.repeat(np.arange(ORDERS), line_count)
+    return OrderColumns(
+        cost=rng.uniform(5, 100, ORDERS),
+        card_count=rng.integers(0, 50, ORDERS).astype(float),
+        used_points=rng.integers(0, 50, ORDERS).astype(float),
+        has_card=rng.random(ORDERS) < 0.7,
+        line_count=line_count,
+        line_order=line_order,
+        line_item=rng.integers(1, 10, len(line_order))
+    )
+
+
+def _redeem_one_by_one(event_data: CreatingEvent, orders: OrderColumns):
+    rule_set = RuleSet.compile([GettingEvent(id=1, is_active=True, **event_data.model_dump())])
+    redemptions, discount, awarded, spent = 0, 0.0, 0.0, 0.0
+
+    for position in range(len(orders)):
+        if not orders.has_card[position]:
+            continue
+
+        order = GettingOrder.model_construct(id=position, cost=float(orders.cost[position]), items=[
+            GettingOrderItem.model_construct(id=int(item_id))
+            for item_id in orders.line_item[orders.line_order == position]
+        ])
+        card = GettingCard(id=1, phone="+420000000000", user_id=uuid.uuid4(),
+                           count=int(orders.card_count[position]), used_points=int(orders.used_points[position]))
+        try:
+            redeemed_order, redeemed_card = rule_set.redeem([1], order, card)
+        except ValueError:
+            continue
+
+        redemptions += 1
+        discount += order.cost - redeemed_order.cost
+        awarded += max(redeemed_card.count - card.count, 0)
+        spent += redeemed_card.used_points - card.used_points
+
+    return redemptions, discount, awarded, spent
+
+
+@pytest.mark.parametrize("event_data", [
+    CreatingEvent(
+        title="Item and points",
+        criteria=[
+            {"contrast": "greater_than", "value": 10},
+            {"contrast": "define_item_in_order", "value": 3},
+            {"contrast": "count_items_in_order", "value": 2}
+        ],
+        benefits=[
+            {"action": "reduce_order_sum", "value": 2},
+            {"action": "reduce_order_sum_percent", "value": 10},
+            {"action": "reduce_card_bonuses", "value": 5}
+        ]
+    ),
+    CreatingEvent(
+        title="Loyalty bonus",
+        criteria=[{"contrast": "greater_for_all", "value": 40}],
+        benefits=[{"action": "add_cart_bonuses", "value": 3}]
+    ),
+])
+def test_backtest_matches_redemption(event_data: CreatingEvent):
+    orders = _random_orders(np.random.default_rng(7))
+
+    result = evaluate_event(event_data, orders)
+    redemptions, discount, awarded, spent = _redeem_one_by_one(event_data, orders)
+
+    assert result.orders == ORDERS
+    assert result.redemptions == redemptions > 0
+    assert result.redemption_rate == pytest.approx(redemptions / ORDERS)
+    assert result.discount_total == pytest.approx(discount)
+    assert result.points_awarded == pytest.approx(awarded)
+    assert result.points_spent == pytest.approx(spent)
+
+
+@pytest.mark.parametrize("contrast", ["greater_than", "greater_for_all"])
+def test_backtest_refuses_criteria_on_card_points(contrast: str):
+    with pytest.raises(ValidationError, match="cannot be backtested"):
+        BacktestForm(date_from="2024-01-01", date_to="2024-01-31", event=CreatingEvent(
+            title="Loyal customer",
+            criteria=[{"contrast": "define_item_in_order", "value": 3}, {"contrast": contrast, "value": 10}],
+            benefits=[{"action": "reduce_order_sum", "value": 2}]
+        ))
+
+    BacktestForm(date_from="2024-01-01", date_to="2024-01-31", event=CreatingEvent(
+        title="Item in order",
+        criteria=[{"contrast": "define_item_in_order", "value": 3}],
+        benefits=[{"action": "add_cart_bonuses", "value": 2}]
+    ))
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from conftest import async_session_maker
+from src.database import unit_of_work
+from src.order.model import order, order_item, order_item_ingredient
+from src.order.schema import CreatingBatchOrder, CreatingOrder
+from src.order.service import create_orders, create_orders_batch
+from src.report.model import report_watermark
+from src.report.service import WATERMARK_NAME
+from test_stock_deduction import _seed_item, _seed_product
+
+
+@pytest.mark.asyncio
+async def test_lines_come_back_in_input_order():
+    async with unit_of_work(async_session_maker) as db:
+        milk = await _seed_product(db, 1000.0)
+        item_ids = [await _seed_item(db, {}) for _ in range(3)]
+
+    carts = [
+        [(item_ids[2], 3), (item_ids[0], 1), (item_ids[1], 7), (item_ids[0], 2)],
+        [(item_ids[1], 4), (item_ids[2], 5)],
+    ]
+    async with unit_of_work(async_session_maker) as db:
+        created_orders = await create_orders([
+            CreatingOrder(items=[
+                # The extra ingredient value identifies the line it was sent with
+                {"item_id": item_id, "count": count, "ingredients": [{"product_id": milk, "value": count / 10}]}
+                for item_id, count in cart
+            ])
+            for cart in carts
+        ], db)
+
+    async with unit_of_work(async_session_maker) as db:
+        for created_order, cart in zip(created_orders, carts):
+            lines = (await db.execute(
+                select(order_item.c.item_id, order_item.c.count, order_item_ingredient.c.value)
+                .join(order_item_ingredient, order_item_ingredient.c.order_item_id == order_item.c.id)
+                .where(order_item.c.order_id == created_order.id)
+                .order_by(order_item.c.id)
+            )).fetchall()
+
+            assert [(row.item_id, row.count) for row in lines] == cart
+            assert [row.value for row in lines] == pytest.approx([count / 10 for _, count in cart])
+            assert [(line.id, line.count) for line in created_order.items] == cart
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_invalid_orders_and_keeps_sale_dates():
+    async with unit_of_work(async_session_maker) as db:
+        milk = await _seed_product(db, 1.0)
+        latte = await _seed_item(db, {milk: 2.0})
+        await db.execute(report_watermark.delete().where(report_watermark.c.name == WATERMARK_NAME))
+        await db.execute(report_watermark.insert().values(name=WATERMARK_NAME, day=datetime.utcnow().date()))
+
+    sold_at = datetime.utcnow().replace(microsecond=0) - timedelta(days=3)
+    async with unit_of_work(async_session_maker) as db:
+        results = await create_orders_batch([
+            CreatingBatchOrder(date=sold_at, items=[{"item_id": latte, "count": 1}]),
+            CreatingBatchOrder(date=sold_at, items=[{"item_id": latte + 1000, "count": 1}]),
+            CreatingBatchOrder(items=[{"item_id": latte, "count": 1, "ingredients": [{"product_id": milk + 1000,
+                                                                                       "value": 1.0}]}]),
+            CreatingBatchOrder(items=[{"item_id": latte, "count": 2}]),
+        ], db)
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert results[1].order is None and results[1].error == f"Item with ID {latte + 1000} not found."
+    assert results[2].order is None and results[2].error == f"Product with ID {milk + 1000} not found."
+    # A shortage does not reject orders already served at the till
+    assert results[0].error is None and results[3].error is None
+    assert results[0].order.date == sold_at.date()
+    assert results[3].order.date == datetime.utcnow().date()
+
+    async with unit_of_work(async_session_maker) as db:
+        stored = dict((await db.execute(
+            select(order.c.id, order.c.date).where(order.c.id.in_([results[0].order.id, results[3].order.id]))
+        )).all())
+        watermark = (await db.execute(
+            select(report_watermark.c.day).where(report_watermark.c.name == WATERMARK_NAME)
+        )).scalar()
+
+    assert stored[results[0].order.id] == sold_at
+    assert stored[results[3].order.id].date() == datetime.utcnow().date()
+    # The rollups of the sale day are recomputed on the next refresh
+    assert watermark == sold_at.date()
@@ -0,0 +1,80 @@
+import uuid
+
+import pytest
+
+from src.card.schema import GettingCard
+from src.event.rules import RuleSet
+from src.event.schema import CreatingEvent, GettingEvent
+from src.order.schema import GettingOrder
+
+
+def _rule_set(*events: CreatingEvent, inactive=()) -> RuleSet:
+    # RuleSet is compiled from the active events only, like get_rule_set does
+    return RuleSet.compile([
+        GettingEvent(id=event_id, is_active=True, **event_data.model_dump())
+        for event_id, event_data in enumerate(events, start=1) if event_id not in inactive
+    ])
+
+
+def _order(cost: float) -> GettingOrder:
+    return GettingOrder.model_construct(id=1, cost=cost, items=[])
+
+
+def _card(count: int, used_points: int = 0) -> GettingCard:
+    return GettingCard(id=1, phone="+420000000000", user_id=uuid.uuid4(), count=count, used_points=used_points)
+
+
+def test_benefits_are_chained_across_akce():
+    rule_set = _rule_set(
+        CreatingEvent(title="Discount and points", benefits=[
+            {"action": "reduce_order_sum", "value": 10},
+            {"action": "add_cart_bonuses", "value": 3}
+        ]),
+        CreatingEvent(title="Pay with points", criteria=[{"contrast": "greater_than", "value": 4}], benefits=[
+            {"action": "reduce_order_sum_percent", "value": 10},
+            {"action": "reduce_card_bonuses", "value": 2}
+        ])
+    )
+
+    order, card = rule_set.redeem([1, 2], _order(100.0), _card(5))
+
+    assert order.cost == pytest.approx((100.0 - 10) * 0.9)
+    assert (card.count, card.used_points) == (5 + 3 - 2, 2)
+
+
+def test_criteria_see_the_order_and_card_before_any_akce():
+    rule_set = _rule_set(
+        CreatingEvent(title="Spend points", benefits=[{"action": "reduce_card_bonuses", "value": 4}]),
+        CreatingEvent(title="Loyal customer", criteria=[{"contrast": "greater_than", "value": 4}],
+                      benefits=[{"action": "reduce_order_sum", "value": 5}])
+    )
+
+    # The first akce leaves 1 point, the second one still sees the original 5
+    order, card = rule_set.redeem([1, 2], _order(50.0), _card(5))
+
+    assert order.cost == pytest.approx(45.0)
+    assert (card.count, card.used_points) == (1, 4)
+
+
+@pytest.mark.parametrize("benefit, count, used_points", [
+    ({"action": "add_cart_bonuses", "value": 1.6}, 12, 0),
+    ({"action": "add_cart_bonuses", "value": 1.4}, 11, 0),
+    ({"action": "reduce_card_bonuses", "value": 2.7}, 7, 3),
+])
+def test_points_are_rounded_to_whole_points(benefit: dict, count: int, used_points: int):
+    rule_set = _rule_set(CreatingEvent(title="Fractional points", benefits=[benefit]))
+
+    _, card = rule_set.redeem([1], _order(20.0), _card(10))
+
+    assert (card.count, card.used_points) == (count, used_points)
+
+
+def test_inactive_akce_is_refused():
+    rule_set = _rule_set(
+        CreatingEvent(title="Running", benefits=[{"action": "reduce_order_sum", "value": 1}]),
+        CreatingEvent(title="Finished", benefits=[{"action": "reduce_order_sum", "value": 1}]),
+        inactive={2}
+    )
+
+    with pytest.raises(ValueError, match="Active event with ID 2 not found"):
+        rule_set.redeem([1, 2], _order(20.0), _card(10))
@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from conftest import async_session_maker
+from src.database import unit_of_work
+from src.item.model import item, ingredient
+from src.order.schema import CreatingOrder
+from src.order.service import create_order
+from src.product.model import product, product_value_type
+from src.product.service import deduct_products, InsufficientStockError
+
+
+async def _seed_product(db, value: float) -> int:
+    value_type_id = (await db.execute(
+        product_value_type.insert().values(name=f"unit-{uuid.uuid4().hex[:8]}").returning(product_value_type.c.id)
+    )).scalar()
+    return (await db.execute(
+        product.insert().values(name=f"product-{uuid.uuid4().hex[:8]}", value=value,
+                                value_type_id=value_type_id, cost_per_one=1.0).returning(product.c.id)
+    )).scalar()
+
+
+async def _seed_item(db, recipe: dict) -> int:
+    item_id = (await db.execute(
+        item.insert().values(title=f"item-{uuid.uuid4().hex[:8]}", is_active=True, actualise_cost=False, cost=5.0)
+        .returning(item.c.id)
+    )).scalar()
+    for product_id, value in recipe.items():
+        await db.execute(ingredient.insert().values(item_id=item_id, product_id=product_id, value=value))
+    return item_id
+
+
+async def _stock(product_id: int) -> float:
+    async with unit_of_work(async_session_maker) as db:
+        return (await db.execute(select(product.c.value).where(product.c.id == product_id))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_deduction_below_zero_is_rejected():
+    async with unit_of_work(async_session_maker) as db:
+        milk = await _seed_product(db, 1.0)
+        coffee = await _seed_product(db, 10.0)
+
+    with pytest.raises(InsufficientStockError) as error:
+        async with unit_of_work(async_session_maker) as db:
+            await deduct_products({milk: 1.5, coffee: 2.0}, db)
+
+    assert [short["product_id"] for short in error.value.shortages] == [milk]
+    # Nothing is deducted when one of the products is short
+    assert await _stock(milk) == 1.0
+    assert await _stock(coffee) == 10.0
+
+
+@pytest.mark.asyncio
+async def test_lines_of_the_same_product_are_combined():
+    async with unit_of_work(async_session_maker) as db:
+        milk = await _seed_product(db, 10.0)
+        latte = await _seed_item(db, {milk: 2.0})
+
+    # 2 * 2 + 1 * 2 + 1 * 1 = 7 of milk over three requirements
+    async with unit_of_work(async_session_maker) as db:
+        await create_order(CreatingOrder(items=[
+            {"item_id": latte, "count": 2},
+            {"item_id": latte, "count": 1, "ingredients": [{"product_id": milk, "value": 1.0}]}
+        ]), db)
+    assert await _stock(milk) == pytest.approx(3.0)
+
+    # Each line alone fits into the 3 left, together they do not
+    with pytest.raises(InsufficientStockError) as error:
+        async with unit_of_work(async_session_maker) as db:
+            await create_order(CreatingOrder(items=[
+                {"item_id": latte, "count": 1},
+                {"item_id": latte, "count": 1}
+            ]), db)
+
+    assert error.value.shortages[0]["required"] == pytest.approx(4.0)
+    assert await _stock(milk) == pytest.approx(3.0)